@@ -5,13 +5,17 @@ from api.routes.books import books_bp
 from api.routes.users import users_bp
 from api.routes.authors import authors_bp
 from api.routes.orders import orders_bp
+from api.routes.reports import reports_bp
+from api.services import request_logging
 
 app = Flask(__name__)
+request_logging.init_app(app)
 
 app.register_blueprint(books_bp)
 app.register_blueprint(users_bp)
 app.register_blueprint(authors_bp)
 app.register_blueprint(orders_bp)
+app.register_blueprint(reports_bp)
 
 if __name__ == '__main__':
     app.run(debug=True)
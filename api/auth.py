@@ -1,43 +1,65 @@
 # Extract token from Authorization header
+import logging
 from functools import wraps
 
 from flask import jsonify, request
 import jwt
+from api.services.revocation import revocation_list
+from api.services.user_cache import user_cache
 from utils.db import SessionLocal
 from utils.config import Config
 from utils.models import User
 
+logger = logging.getLogger(__name__)
+
+
+def _load_user_role(user_id):
+    """Return the role of user_id from the database, or None if there is no such user."""
+    session = SessionLocal()
+    try:
+        return session.query(User.role).filter_by(id=user_id).scalar()
+    finally:
+        session.close()
+
 
 def token_required(func):
     @wraps(func)
     def decorated(*args, **kwargs):
-        session = SessionLocal()
         token = request.headers.get('Authorization')
-        print("Token received:", token)
 
         if not token:
+            logger.info("Token missing")
             return jsonify({'message': 'Token is missing!'}), 401
 
         try:
             data = jwt.decode(token, Config.JWT_SECRET_KEY, algorithms=["HS256"])
-            print("Decoded token data:", data)
-            current_user = session.query(User).filter_by(id=data['id']).first()
-            if (not current_user):
-                return jsonify({'message': 'User not found!'}), 401
+            # Tokens ended by logout, checked in memory without a query
+            if revocation_list.is_revoked(data.get('jti')):
+                logger.info("Revoked token", extra={"user_id": data.get('id')})
+                return jsonify({'message': 'Token has been revoked!'}), 401
+            logger.debug("Token accepted", extra={"user_id": data.get('id'), "role": data.get('role')})
+            # Confirm the user still exists, from the user cache when possible
+            role = user_cache.get(data['id'])
+            if role is None:
+                role = _load_user_role(data['id'])
+                if role is None:
+                    return jsonify({'message': 'User not found!'}), 401
+                user_cache.set(data['id'], role)
+            # Tokens issued before a role change are no longer honoured
+            if role.lower() != str(data.get('role', '')).lower():
+                return jsonify({'message': 'Token is invalid!'}), 401
         except jwt.InvalidSignatureError:
-            print("Error: Invalid token signature.")
+            logger.info("Invalid token signature")
             return jsonify({'message': 'Token is invalid!'}), 401
         except jwt.ExpiredSignatureError:
-            print("Error: Token has expired.")
+            logger.info("Token has expired")
             return jsonify({'message': 'Token has expired!'}), 401
         except jwt.InvalidTokenError as e:
-            print(f"Error: Invalid token - {e}")
+            logger.info("Invalid token: %s", e)
             return jsonify({'message': 'Token is invalid!'}), 401
-        except Exception as e:
-            print(f"An unexpected error occurred: {e}")
+        except Exception:
+            logger.exception("Unexpected error while checking token")
             return jsonify({'message': 'Token is invalid!'}), 401
-        finally:
-            session.close()
         return func(data, *args, **kwargs)
 
     return decorated
@@ -50,8 +72,8 @@ def role_required(required_role):
         def decorated(data, *args, **kwargs):
             # data comes from token_required
             role = data.get("role")
-            print(f"User role from token: {role}, required role: {required_role}")
             if not role or role.lower() != required_role.lower():
+                logger.info("Role check failed", extra={"role": role, "required_role": required_role})
                 return jsonify({'message': 'You do not have permission to access this resource!'}), 403
             return f(data, *args, **kwargs)
         return decorated
@@ -3,6 +3,9 @@
 from flask import Blueprint, jsonify, request
 from sqlalchemy import or_, select
 from api.auth import role_required, token_required
+from api.services.conditional import conditional_jsonify
+from api.services.counts import count_cache, parse_include_total, get_total_count
+from api.services.response_cache import catalog_cache
 from utils.db import SessionLocal
 from utils.models import Author, Book
 
@@ -15,19 +18,20 @@ def get_authors(context):
     session = SessionLocal()
     page_number = request.args.get("page_number", 1, type=int)
     page_size = request.args.get("page_size", 100, type=int)
-    include_total = request.args.get("include_total", "false").lower() == "true"
+    include_total = parse_include_total(request.args.get("include_total"))
     try:
         authors = session.query(Author).order_by(Author.id).offset((page_number - 1) * page_size).limit(page_size).all()
 
         authors_list = [{"id": a.id, "name": a.name, "bio": a.bio} for a in authors]
         if include_total:
-            total_count = session.query(Author).count()
-            return jsonify({"authors": authors_list, "page": {
+            total_count, estimated = get_total_count(session, "authors", (), session.query(Author), include_total, filtered=False)
+            return conditional_jsonify({"authors": authors_list, "page": {
                 "current_page": page_number,
                 "total_pages": (total_count + page_size - 1) // page_size,
+                "total_is_estimate": estimated,
             }})
         else:
-            return jsonify({"authors": authors_list, "page": {
+            return conditional_jsonify({"authors": authors_list, "page": {
                 "current_page": page_number
             }})
     except Exception as e:
@@ -44,7 +48,7 @@ def get_author(context, id):
         author = session.get(Author, id)
         if not author:
             return jsonify({"error": "Author not found"}), 404
-        return jsonify({"id": author.id, "name": author.name, "bio": author.bio})
+        return conditional_jsonify({"id": author.id, "name": author.name, "bio": author.bio})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     finally:
@@ -64,6 +68,7 @@ def create_author(context):
         new_author = Author(name=name, bio=bio)
         session.add(new_author)
         session.commit()
+        count_cache.invalidate("authors")
         return jsonify({"message": "Author created successfully", "author_id": new_author.id}), 201
     except Exception as e:
         session.rollback()
@@ -93,6 +98,9 @@ def update_author_bio(context, id):
         if new_name:
             author.name = new_name
         session.commit()
+        # author_name filters on books match by name
+        count_cache.invalidate("books")
+        catalog_cache.invalidate("books")
         return jsonify({"message": "Author updated successfully"})
     except Exception as e:
         session.rollback()
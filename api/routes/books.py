@@ -1,97 +1,281 @@
 # books.py
 
-from flask import Blueprint, jsonify, request
-from sqlalchemy import or_, select, func, distinct
+import logging
+from bisect import bisect_right
+
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from sqlalchemy import delete, or_, select, func, distinct, update
+from sqlalchemy.orm import joinedload, load_only, selectinload
 from api.auth import role_required, token_required
+from api.services.conditional import conditional_jsonify, conditional_response, json_body
+from api.services.bulk_import import BULK_CHUNK_SIZE, BULK_MAX_CHUNK_SIZE, import_chunk, parse_rows
+from api.services.counts import count_cache, parse_include_total, get_total_count
+from api.services.catalog_index import catalog_index, record_book_changes
+from api.services.pagination import decode_cursor, encode_cursor
+from api.services.response_cache import book_list_tags, book_status_tags, catalog_cache
+from api.services.search import title_contains_filter, title_index
 from utils.db import SessionLocal
-from utils.models import Author, Book, BookKeyword, Keyword, Order, OrderLine
+from utils.models import ActiveRental, Author, Book, BookKeyword, Keyword
 
 books_bp = Blueprint("books", __name__, url_prefix="/api/v1/books")
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK_SIZE = 1000
+BATCH_MAX_IDS = 500
+BULK_STATUS_MAX_ROWS = 10000
+
+
+# Fields a client may request with `fields=`; list endpoints default to the summary fields
+BOOK_LIST_FIELDS = ("id", "title", "status", "author", "price_buy", "price_rent")
+BOOK_DETAIL_FIELDS = BOOK_LIST_FIELDS + ("description", "keywords")
+
+_BOOK_FIELD_VALUES = {
+    "id": lambda b: b.id,
+    "title": lambda b: b.title,
+    "status": lambda b: b.status,
+    "author": lambda b: {"id": b.author.id, "name": b.author.name},
+    "price_buy": lambda b: b.price_buy,
+    "price_rent": lambda b: b.price_rent,
+    "description": lambda b: b.description,
+    "keywords": lambda b: [{"word": kw.keyword.word, "id": kw.keyword.id} for kw in b.keywords],
+}
+
+
+def _requested_fields(default):
+    """Parse the `fields` query parameter (comma separated). Raises ValueError for unknown fields."""
+    raw = request.args.get("fields", None)
+    if not raw:
+        return default
+    fields = tuple(dict.fromkeys(f.strip() for f in raw.split(",") if f.strip()))
+    unknown = [f for f in fields if f not in BOOK_DETAIL_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields or default
+
+
+def _book_load_options(fields):
+    """Loader options that select only the columns and relationships fields need."""
+    columns = [Book.id] + [getattr(Book, f) for f in fields if f in ("title", "status", "price_buy", "price_rent", "description")]
+    if "author" in fields:
+        columns.append(Book.author_id)
+    options = [load_only(*columns)]
+    if "author" in fields:
+        options.append(joinedload(Book.author).load_only(Author.id, Author.name))
+    if "keywords" in fields:
+        options.append(selectinload(Book.keywords).joinedload(BookKeyword.keyword))
+    return options
+
+
+def _serialize_book(book, fields):
+    return {f: _BOOK_FIELD_VALUES[f](book) for f in fields}
+
+
+def _status_filter(status):
+    """Expand the status query parameter into the list of book statuses it covers."""
+    status = status.lower() if status else None
+    if status == "available":
+        return ["new", "returned"]
+    elif status == "unavailable":
+        return ["rented", "sold"]
+    elif status == "used":
+        return ["returned"]
+    elif status:
+        return [status]
+    return None
+
+
+def _clean_keywords(keywords):
+    return [k.strip() for k in keywords if k] if keywords else None
+
+
+def _keyword_filters(all_of, any_of, none_of):
+    """SQL form of the keyword filters, for queries the in-memory index can't answer alone."""
+    def has_keyword(words):
+        return (
+            select(BookKeyword.book_id)
+            .join(Keyword, BookKeyword.keyword_id == Keyword.id)
+            .where(BookKeyword.book_id == Book.id, Keyword.word.in_(words))
+            .exists()
+        )
+
+    filters = [has_keyword([word]) for word in all_of or ()]
+    if any_of:
+        filters.append(has_keyword(any_of))
+    if none_of:
+        filters.append(~has_keyword(none_of))
+    return filters
+
+
+def _wants_stream():
+    if request.args.get("stream", "false").lower() == "true":
+        return True
+    return request.accept_mimetypes.best_match(["application/json", "application/x-ndjson"]) == "application/x-ndjson"
+
+
+def _stream_books(statuses):
+    """Stream books with the given statuses as NDJSON, one book per line.
+
+    Rows are read in chunks of STREAM_CHUNK_SIZE, each chunk seeking past the last
+    id of the previous one, and serialized as they arrive. mysql-connector has no
+    server-side cursor support in SQLAlchemy, so chunked seeks are what keep memory
+    flat as the catalog grows.
+    """
+    query = (
+        select(Book.id, Book.title, Book.status, Book.price_buy, Book.price_rent, Author.id.label("author_id"), Author.name.label("author_name"))
+        .join(Author, Book.author_id == Author.id)
+        .filter(Book.status.in_(statuses))
+        .order_by(Book.id)
+        .limit(STREAM_CHUNK_SIZE)
+    )
+
+    def generate():
+        session = SessionLocal()
+        try:
+            last_id = 0
+            while True:
+                rows = session.execute(query.filter(Book.id > last_id)).all()
+                if not rows:
+                    break
+                yield "".join(current_app.json.dumps({"id": r.id, "title": r.title, "status": r.status, "author": {"id": r.author_id, "name": r.author_name}, "price_buy": r.price_buy, "price_rent": r.price_rent}) + "\n" for r in rows)
+                last_id = rows[-1].id
+        finally:
+            session.close()
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
 
 
 @books_bp.route("/", methods=["GET"])
 @token_required
 def get_books(context):
-    author_id = request.args.get("author_id", None)
+    author_id = request.args.get("author_id", None, type=int)
     author_name = request.args.get("author_name", None)
     status = request.args.get("status", None)
     keyword = request.args.getlist("keyword", None)
+    keyword_any = request.args.getlist("keyword_any", None)
+    keyword_not = request.args.getlist("keyword_not", None)
     title_contains = request.args.get("title_contains", None)
     page_number = request.args.get("page_number", 1, type=int)
     page_size = request.args.get("page_size", 100, type=int)
-    include_total = request.args.get("include_total", "false").lower() == "true"
-
-    print(f"Filters - author_id: {author_id}, author_name: {author_name}, status: {status}, keyword: {keyword}, title_contains: {title_contains}, page_number: {page_number}, page_size: {page_size}")
+    include_total = parse_include_total(request.args.get("include_total"))
+    # Keyset mode: pass `cursor` (empty for the first page) or `after_id` instead of page_number
+    cursor = request.args.get("cursor", None)
+    after_id = request.args.get("after_id", None, type=int)
+    use_cursor = cursor is not None or after_id is not None
+    try:
+        fields = _requested_fields(BOOK_LIST_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if cursor:
+        try:
+            after_id = int(decode_cursor(cursor)["id"])
+        except (ValueError, KeyError, TypeError):
+            return jsonify({"error": "Invalid cursor"}), 400
+
+    logger.debug("Book list filters", extra={"author_id": author_id, "author_name": author_name, "status": status, "keyword": keyword, "title_contains": title_contains, "page_number": page_number, "page_size": page_size})
     session = SessionLocal()
     try:
-        status = status.lower() if status else None
-        if status == "available":
-            status = ["new", "returned"]
-        elif status == "unavailable":
-            status = ["rented", "sold"]
-        elif status == "used":
-            status = ["returned"]
-        elif status and not isinstance(status, list):
-            status = [status]
+        status = _status_filter(status)
         
         # Normalize and clean inputs
-        keyword = [k.strip() for k in keyword if k] if keyword else None
-
-        # Build query dynamically based on provided filters
-        query = session.query(Book)
-        filters = []
-        if author_id:
-            filters.append(Book.author_id == author_id)
-        elif author_name:
-            filters.append(Book.author.has(Author.name == author_name))
-        if status:
-            filters.append(Book.status.in_(status))
-
-        # Require that a book matches ALL provided keywords.
-        # Build a grouped subquery over the association table and keywords
-        # and require the matched keyword count equals the number of keywords.
-        if keyword:
-            kw_subq = (
-                session.query(BookKeyword.book_id)
-                .join(Keyword, BookKeyword.keyword_id == Keyword.id)
-                .filter(Keyword.word.in_(keyword))
-                .group_by(BookKeyword.book_id)
-                .having(func.count(distinct(Keyword.id)) == len(keyword))
-                .subquery()
-            )
-
-            filters.append(Book.id.in_(kw_subq))
-            print(f"Filtering by keywords (all required) via grouped subquery: {keyword}")
-
-        if title_contains:
-            filters.append(Book.title.ilike(f"%{title_contains}%"))
-        
-        # Build an ID-only base query for pagination and counting
-        base = session.query(Book.id).filter(*filters).order_by(Book.id)
-        if include_total:
-            total_count = base.count()
-
-        ids_subquery = base.offset((page_number - 1) * page_size).limit(page_size).subquery()
-
-        # Fetch full Book rows for the page via the ID subquery join
+        keyword = _clean_keywords(keyword)
+        keyword_any = _clean_keywords(keyword_any)
+        keyword_not = _clean_keywords(keyword_not)
+
+        # Serve repeated catalog searches from the response cache
+        cache_key = (author_id, author_name, tuple(status or ()), tuple(sorted(keyword or ())), tuple(sorted(keyword_any or ())), tuple(sorted(keyword_not or ())), (title_contains or "").lower(), fields, include_total, page_size, after_id if use_cursor else None, None if use_cursor else page_number)
+        cached_body = catalog_cache.get(cache_key)
+        if cached_body is not None:
+            return conditional_response(cached_body)
+        cache_generation = catalog_cache.generation()
+
+        # Keyword filters: a book must match ALL `keyword` values, at least one
+        # `keyword_any` value (if given) and none of the `keyword_not` values
+        has_keyword_filter = bool(keyword or keyword_any or keyword_not)
+
+        if has_keyword_filter and not title_contains:
+            # Answered entirely from the in-memory bitmap index, which also holds status
+            # and author; the page and the total come from the sorted id list
+            author_ids = None
+            if author_id:
+                author_ids = [author_id]
+            elif author_name:
+                author_ids = [a.id for a in session.query(Author.id).filter(Author.name == author_name)]
+            matching_ids = catalog_index.query(session, all_of=keyword or (), any_of=keyword_any or (), none_of=keyword_not or (), statuses=status, author_ids=author_ids)
+            logger.debug("Keyword filter", extra={"keyword": keyword, "keyword_any": keyword_any, "keyword_not": keyword_not, "matches": len(matching_ids)})
+            total_count, estimated = len(matching_ids), False
+            if use_cursor:
+                start = bisect_right(matching_ids, after_id) if after_id is not None else 0
+            else:
+                start = max(page_number - 1, 0) * page_size
+            page_ids = matching_ids[start:start + page_size]
+            has_more = start + page_size < len(matching_ids)
+            ids_subquery = session.query(Book.id).filter(Book.id.in_(page_ids)).subquery()
+        else:
+            # Build query dynamically based on provided filters
+            filters = []
+            if author_id:
+                filters.append(Book.author_id == author_id)
+            elif author_name:
+                filters.append(Book.author.has(Author.name == author_name))
+            if status:
+                filters.append(Book.status.in_(status))
+            if has_keyword_filter:
+                filters.extend(_keyword_filters(keyword, keyword_any, keyword_not))
+            if title_contains:
+                filters.append(title_contains_filter(session, title_contains))
+
+            # Build an ID-only base query for pagination and counting
+            base = session.query(Book.id).filter(*filters).order_by(Book.id)
+            if include_total:
+                signature = (author_id, author_name, tuple(status or ()), tuple(sorted(keyword or ())), tuple(sorted(keyword_any or ())), tuple(sorted(keyword_not or ())), (title_contains or "").lower())
+                total_count, estimated = get_total_count(session, "books", signature, base, include_total, filtered=bool(filters))
+
+            if use_cursor:
+                # Seek past the last id of the previous page instead of scanning and discarding
+                # earlier rows. The secondary indexes (status, author_id) carry the primary key,
+                # so the seek stays on the active filter's index.
+                if after_id is not None:
+                    base = base.filter(Book.id > after_id)
+                # Fetch one extra id to know whether another page exists
+                page_ids = [row.id for row in base.limit(page_size + 1).all()]
+                has_more = len(page_ids) > page_size
+                page_ids = page_ids[:page_size]
+                ids_subquery = session.query(Book.id).filter(Book.id.in_(page_ids)).subquery()
+            else:
+                ids_subquery = base.offset((page_number - 1) * page_size).limit(page_size).subquery()
+
+        # Fetch the requested columns for the page via the ID subquery join, loading
+        # authors in the same statement instead of one lazy load per book
         books = (
             session.query(Book)
+            .options(*_book_load_options(fields))
             .join(ids_subquery, Book.id == ids_subquery.c.id)
+            .order_by(Book.id)
             .all()
         )
         # books = query.filter(*filters).order_by(Book.id).offset((page_number - 1) * page_size).limit(page_size).all()
 
-        books_list = [{"id": b.id, "title": b.title, "status": b.status, "author": {"id": b.author.id, "name": b.author.name}, "price_buy": b.price_buy, "price_rent": b.price_rent} for b in books]
-        
-        if include_total:
-            return jsonify({"books": books_list, "page": {
+        books_list = [_serialize_book(b, fields) for b in books]
+
+        if use_cursor:
+            page = {"next_cursor": encode_cursor({"id": books[-1].id}) if has_more and books else None}
+            if include_total:
+                page["total_pages"] = (total_count + page_size - 1) // page_size
+                page["total_is_estimate"] = estimated
+        elif include_total:
+            page = {
                 "current_page": page_number,
                 "total_pages": (total_count + page_size - 1) // page_size,
-            }})
+                "total_is_estimate": estimated,
+            }
         else:
-            return jsonify({"books": books_list, "page": {
+            page = {
                 "current_page": page_number
-            }})
+            }
+
+        body = json_body({"books": books_list, "page": page})
+        catalog_cache.set(cache_key, body, book_list_tags(status), cache_generation)
+        return conditional_response(body)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     finally:
@@ -101,16 +285,48 @@ def get_books(context):
 @books_bp.route("/<int:id>", methods=["GET"])
 @token_required
 def get_book(context, id):
+    try:
+        fields = _requested_fields(BOOK_DETAIL_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     session = SessionLocal()
     try:
-        book = session.get(Book, id)
+        book = session.get(Book, id, options=_book_load_options(fields))
         if not book:
             return jsonify({"error": "Book not found"}), 404
-        
-        keyword_list = [{"word": kw.keyword.word, "id": kw.keyword.id} for kw in book.keywords]
-        for kw in book.keywords:
-            print(kw)
-        return jsonify({"id": book.id, "title": book.title, "status": book.status, "author": {"id": book.author.id, "name": book.author.name}, "keywords": keyword_list, "price_buy": book.price_buy, "price_rent": book.price_rent, "description": book.description})
+
+        return conditional_jsonify(_serialize_book(book, fields))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        session.close()
+
+
+# Full details for many books at once, e.g. /batch?ids=1,2,3 or /batch?ids=1&ids=2
+@books_bp.route("/batch", methods=["GET"])
+@token_required
+def get_books_batch(context):
+    try:
+        ids = [int(part) for value in request.args.getlist("ids") for part in value.split(",") if part.strip()]
+    except ValueError:
+        return jsonify({"error": "ids must be integers"}), 400
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return jsonify({"error": "At least one id must be provided"}), 400
+    if len(ids) > BATCH_MAX_IDS:
+        return jsonify({"error": f"At most {BATCH_MAX_IDS} ids may be requested at once"}), 400
+    try:
+        fields = _requested_fields(BOOK_DETAIL_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    session = SessionLocal()
+    try:
+        books = session.query(Book).options(*_book_load_options(fields)).filter(Book.id.in_(ids)).all()
+        books_by_id = {b.id: b for b in books}
+        books_list = [_serialize_book(books_by_id[i], fields) for i in ids if i in books_by_id]
+        missing = [i for i in ids if i not in books_by_id]
+        return jsonify({"books": books_list, "missing": missing})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     finally:
@@ -120,11 +336,17 @@ def get_book(context, id):
 @books_bp.route("/available", methods=["GET"])
 @token_required
 def get_available_books(context):
+    if _wants_stream():
+        return _stream_books(["new", "returned"])
+    try:
+        fields = _requested_fields(BOOK_LIST_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     session = SessionLocal()
     try:
-        books = session.query(Book).filter(or_(Book.status == "new", Book.status == "returned")).all()
+        books = session.query(Book).options(*_book_load_options(fields)).filter(or_(Book.status == "new", Book.status == "returned")).all()
         
-        books_list = [{"id": b.id, "title": b.title, "status": b.status, "author": {"id": b.author.id, "name": b.author.name}, "price_buy": b.price_buy, "price_rent": b.price_rent} for b in books]
+        books_list = [_serialize_book(b, fields) for b in books]
         return jsonify({"books": books_list})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -135,11 +357,17 @@ def get_available_books(context):
 @books_bp.route("/unavailable", methods=["GET"])
 @token_required
 def get_unavailable_books(context):
+    if _wants_stream():
+        return _stream_books(["rented", "sold"])
+    try:
+        fields = _requested_fields(BOOK_LIST_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     session = SessionLocal()
     try:
-        books = session.query(Book).filter(or_(Book.status == "rented", Book.status == "sold")).all()
+        books = session.query(Book).options(*_book_load_options(fields)).filter(or_(Book.status == "rented", Book.status == "sold")).all()
         
-        books_list = [{"id": b.id, "title": b.title, "status": b.status, "author": {"id": b.author.id, "name": b.author.name}, "price_buy": b.price_buy, "price_rent": b.price_rent} for b in books]
+        books_list = [_serialize_book(b, fields) for b in books]
         return jsonify({"books": books_list})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -147,6 +375,46 @@ def get_unavailable_books(context):
         session.close()
 
 
+# Counts per status and top keywords for the current catalog filters
+@books_bp.route("/facets", methods=["GET"])
+@token_required
+def get_book_facets(context):
+    author_id = request.args.get("author_id", None, type=int)
+    author_name = request.args.get("author_name", None)
+    status = _status_filter(request.args.get("status", None))
+    keyword = _clean_keywords(request.args.getlist("keyword"))
+    keyword_any = _clean_keywords(request.args.getlist("keyword_any"))
+    keyword_not = _clean_keywords(request.args.getlist("keyword_not"))
+    title_contains = request.args.get("title_contains", None)
+    top_keywords = min(request.args.get("top_keywords", 10, type=int), 100)
+
+    session = SessionLocal()
+    try:
+        author_ids = None
+        if author_id:
+            author_ids = [author_id]
+        elif author_name:
+            author_ids = [a.id for a in session.query(Author.id).filter(Author.name == author_name)]
+        book_ids = None
+        if title_contains:
+            book_ids = [b.id for b in session.query(Book.id).filter(title_contains_filter(session, title_contains))]
+
+        facets = catalog_index.facets(session, statuses=status, author_ids=author_ids, book_ids=book_ids, all_of=keyword or (), any_of=keyword_any or (), none_of=keyword_not or (), top_keywords=top_keywords)
+        return jsonify(facets)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        session.close()
+
+
+# Hit/miss counters for the catalog response cache
+@books_bp.route("/cache_stats", methods=["GET"])
+@token_required
+@role_required("Manager")
+def get_catalog_cache_stats(context):
+    return jsonify(catalog_cache.stats())
+
+
 # Get current user's rented books
 @books_bp.route("/rented", methods=["GET"])
 @token_required
@@ -155,8 +423,8 @@ def get_user_rented_books(context):
     user_id = context['id']
     session = SessionLocal()
     try:
-        # Fetch rented books for the user from orders with user_id, order_line with type 'rent', and books with status 'rented'
-        books = session.query(Book).join(OrderLine).join(Order).filter(Order.user_id == user_id, OrderLine.type == 'rent', Book.status == 'rented').all()
+        # Fetch the user's rented books from the active rentals ledger
+        books = session.query(Book).options(load_only(Book.id, Book.title)).join(ActiveRental, ActiveRental.book_id == Book.id).filter(ActiveRental.user_id == user_id).order_by(Book.id).all()
         
         books_list = [{"id": b.id, "title": b.title} for b in books]
         return jsonify({"books": books_list})
@@ -180,7 +448,7 @@ def create_book(context):
     price_rent = data.get("price_rent")
     description = data.get("description", None)
 
-    print(f"Creating book: {title}, Author ID: {author_id}, Author Name: {author_name}, Keywords: {keywords}")
+    logger.info("Creating book", extra={"title": title, "author_id": author_id, "author_name": author_name, "keywords": keywords})
     session = SessionLocal()
     try:
         if (author_id is None):
@@ -224,7 +492,12 @@ def create_book(context):
             # Create the association row
             bk = BookKeyword(book_id=new_book.id, keyword_id=keyword_obj.id)
             session.add(bk)
+        record_book_changes(session, [new_book.id])
         session.commit()
+        count_cache.invalidate("books", "authors")
+        catalog_cache.invalidate("books")
+        title_index.add(new_book.id, title)
+        catalog_index.add_book(new_book.id, "new", author_id, keywords)
         return jsonify({"message": "Book created successfully", "book_id": new_book.id}), 201
     except Exception as e:
         session.rollback()
@@ -233,6 +506,44 @@ def create_book(context):
         session.close()
 
 
+# Bulk catalog import from JSON Lines, CSV or a JSON array, committed in chunks
+@books_bp.route("/bulk", methods=["POST"])
+@token_required
+@role_required("Manager")
+def bulk_create_books(context):
+    chunk_size = min(max(request.args.get("chunk_size", BULK_CHUNK_SIZE, type=int), 1), BULK_MAX_CHUNK_SIZE)
+    try:
+        rows = parse_rows(request.get_data(), request.content_type)
+    except ValueError as e:
+        return jsonify({"error": f"Could not parse request body: {e}"}), 400
+
+    created = []
+    errors = []
+    session = SessionLocal()
+    try:
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            try:
+                chunk_created, chunk_errors = import_chunk(session, chunk)
+                record_book_changes(session, [book["id"] for book in chunk_created])
+                session.commit()
+            except Exception as e:
+                # A database error fails only the rows of this chunk
+                session.rollback()
+                chunk_created, chunk_errors = [], [{"row": number, "error": str(e)} for number, _ in chunk]
+            created.extend(chunk_created)
+            errors.extend(chunk_errors)
+            for book in chunk_created:
+                title_index.add(book["id"], book["title"])
+                catalog_index.add_book(book["id"], "new", book["author_id"], book["keywords"])
+        if created:
+            count_cache.invalidate("books", "authors")
+            catalog_cache.invalidate("books")
+        return jsonify({"created": len(created), "book_ids": [b["id"] for b in created], "errors": sorted(errors, key=lambda e: e["row"])}), 201 if created else 400
+    finally:
+        session.close()
+
+
 @books_bp.route("/<int:id>/update", methods=["PUT"])
 @token_required
 @role_required("Manager")
@@ -292,7 +603,17 @@ def update_book(context, id):
                 bk = BookKeyword(book_id=book.id, keyword_id=keyword_obj.id)
                 session.add(bk)
 
+        if author_id is not None or keywords:
+            record_book_changes(session, [id])
         session.commit()
+        count_cache.invalidate("books")
+        catalog_cache.invalidate("books")
+        if title is not None:
+            title_index.add(id, title)
+        if author_id is not None:
+            catalog_index.set_author(id, author_id)
+        if keywords:
+            catalog_index.set_keywords(id, keywords)
         return jsonify({"message": "Book updated successfully"})
     except Exception as e:
         session.rollback()
@@ -301,6 +622,69 @@ def update_book(context, id):
         session.close()
 
 
+# Update the status of many books at once, selected by ids and/or a filter:
+# {"status": "returned", "ids": [1, 2]} or {"status": "new", "filter": {"status": "returned", "author_id": 3}}
+@books_bp.route("/status", methods=["PATCH"])
+@token_required
+@role_required("Manager")
+def bulk_update_book_status(context):
+    data = request.json
+    if not isinstance(data, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    new_status = data.get("status")
+    ids = data.get("ids")
+    book_filter = data.get("filter") or {}
+
+    if not isinstance(book_filter, dict):
+        return jsonify({"error": "filter must be an object"}), 400
+    if not isinstance(book_filter.get("status") or "", str):
+        return jsonify({"error": "filter.status must be a string"}), 400
+    if not isinstance(book_filter.get("author_id") or 0, int):
+        return jsonify({"error": "filter.author_id must be an integer"}), 400
+    if not isinstance(new_status, str) or new_status not in Book.status.type.enums:
+        return jsonify({"error": f"Invalid status '{new_status}'"}), 400
+    if ids is None and not book_filter:
+        return jsonify({"error": "Provide ids or a filter"}), 400
+
+    filters = []
+    if ids is not None:
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            return jsonify({"error": "ids must be a list of integers"}), 400
+        filters.append(Book.id.in_(ids))
+    if book_filter.get("status"):
+        filters.append(Book.status.in_(_status_filter(book_filter["status"])))
+    if book_filter.get("author_id"):
+        filters.append(Book.author_id == book_filter["author_id"])
+
+    session = SessionLocal()
+    try:
+        # Lock the matching rows so the reported ids are exactly the ones updated
+        matched = session.execute(select(Book.id, Book.status).where(*filters).order_by(Book.id).limit(BULK_STATUS_MAX_ROWS + 1).with_for_update()).all()
+        if len(matched) > BULK_STATUS_MAX_ROWS:
+            session.rollback()
+            return jsonify({"error": f"More than {BULK_STATUS_MAX_ROWS} books match, narrow the selection"}), 400
+        changed = [row for row in matched if row.status != new_status]
+        changed_ids = [row.id for row in changed]
+        if changed_ids:
+            session.execute(update(Book).where(Book.id.in_(changed_ids)).values(status=new_status))
+            if new_status != 'rented':
+                session.execute(delete(ActiveRental).where(ActiveRental.book_id.in_(changed_ids)))
+            record_book_changes(session, changed_ids)
+        session.commit()
+
+        if changed_ids:
+            count_cache.invalidate("books")
+            catalog_cache.invalidate(*book_status_tags(new_status, *{row.status for row in changed}))
+            for book_id in changed_ids:
+                catalog_index.set_status(book_id, new_status)
+        return jsonify({"message": "Book statuses updated successfully", "updated_ids": changed_ids})
+    except Exception as e:
+        session.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        session.close()
+
+
 # Update book status manually
 @books_bp.route("/<int:id>/status", methods=["PATCH"])
 @token_required
@@ -315,8 +699,15 @@ def update_book_status(context, id):
         if not book:
             return jsonify({"error": "Book not found"}), 404
 
+        old_status = book.status
         book.status = new_status
+        if new_status != 'rented':
+            session.execute(delete(ActiveRental).where(ActiveRental.book_id == id))
+        record_book_changes(session, [id])
         session.commit()
+        count_cache.invalidate("books")
+        catalog_cache.invalidate(*book_status_tags(old_status, new_status))
+        catalog_index.set_status(id, new_status)
         return jsonify({"message": "Book status updated successfully"})
     except Exception as e:
         session.rollback()
@@ -340,12 +731,17 @@ def return_rented_book(context, id):
             return jsonify({"error": "Book is not currently rented"}), 400
 
         # Verify that the book is rented by the current user
-        order_line = session.query(OrderLine).join(Order).filter(Order.user_id == user_id, OrderLine.book_id == id, OrderLine.type == 'rent').first()
-        if not order_line:
+        rental = session.get(ActiveRental, id)
+        if not rental or rental.user_id != user_id:
             return jsonify({"error": "You have not rented this book"}), 403
 
+        session.delete(rental)
         book.status = 'returned'
+        record_book_changes(session, [id])
         session.commit()
+        count_cache.invalidate("books")
+        catalog_cache.invalidate(*book_status_tags("rented", "returned"))
+        catalog_index.set_status(id, "returned")
         return jsonify({"message": "Book returned successfully"})
     except Exception as e:
         session.rollback()
@@ -1,14 +1,37 @@
 # orders.py
 
-from flask import Blueprint, jsonify, request, session
-from sqlalchemy import or_, select
-from api.services.billing import generate_bill
+import gzip
+import logging
+import random
+import time
+from datetime import datetime
+
+from flask import Blueprint, current_app, jsonify, request, session, url_for
+from sqlalchemy import and_, delete, insert, or_, select, update
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.orm import load_only, selectinload
+from api.services.billing import store_bill
 from api.auth import role_required, token_required
-from api.services.email import send_email
+from api.services.conditional import conditional_jsonify
+from api.services.counts import count_cache, parse_include_total, get_total_count
+from api.services.catalog_index import catalog_index, record_book_changes
+from api.services.pagination import decode_cursor, encode_cursor
+from api.services.email_outbox import enqueue_email
+from api.services.response_cache import book_status_tags, catalog_cache
+from api.services.sales_rollup import add_orders, move_orders
 from utils.db import SessionLocal
-from utils.models import Author, Book, Order, OrderLine, User
+from utils.models import ActiveRental, Author, Book, Order, OrderBill, OrderLine, User
 
 orders_bp = Blueprint("orders", __name__, url_prefix="/api/v1/orders")
+logger = logging.getLogger(__name__)
+
+BULK_STATUS_MAX_ROWS = 10000
+# Only books in these statuses can be bought or rented
+ORDERABLE_STATUSES = ("new", "returned")
+# create_order retries its transaction after a deadlock (1213) or lock wait timeout (1205)
+MYSQL_LOCK_CONFLICT_ERRORS = (1205, 1213)
+ORDER_MAX_ATTEMPTS = 3
+ORDER_RETRY_BACKOFF_SECONDS = 0.05
 
 
 @orders_bp.route("/", methods=["GET"])
@@ -21,31 +44,50 @@ def get_orders(context):
     
     page_number = request.args.get("page_number", 1, type=int)
     page_size = request.args.get("page_size", 100, type=int)
-    include_total = request.args.get("include_total", "false").lower() == "true"
+    include_total = parse_include_total(request.args.get("include_total"))
+    # Keyset mode: pass `cursor` (empty for the first page) instead of page_number
+    cursor = request.args.get("cursor", None)
+    after = None
+    if cursor:
+        try:
+            values = decode_cursor(cursor)
+            after = (datetime.fromisoformat(values["order_date"]), int(values["id"]))
+        except (ValueError, KeyError, TypeError):
+            return jsonify({"error": "Invalid cursor"}), 400
     session = SessionLocal()
 
     filters = []
     try:
         if status:
             filters.append(Order.payment_status == status)
-        
-        orders = session.query(Order).order_by(Order.id).filter(*filters).offset((page_number - 1) * page_size).limit(page_size).all()
+
+        # Newest orders first; (order_date, id) is unique and indexed together with
+        # payment_status, so both paging modes read the page straight off an index
+        query = session.query(Order).options(selectinload(Order.order_lines)).filter(*filters).order_by(Order.order_date.desc(), Order.id.desc())
+        if cursor is not None:
+            if after is not None:
+                # Seek past the last row of the previous page instead of scanning with OFFSET
+                query = query.filter(or_(Order.order_date < after[0], and_(Order.order_date == after[0], Order.id < after[1])))
+        else:
+            query = query.offset((page_number - 1) * page_size)
+        # Fetch one extra row to know whether another page exists
+        orders = query.limit(page_size + 1).all()
+        has_more = len(orders) > page_size
+        orders = orders[:page_size]
     
         orders_list = []
         for o in orders:
             order_lines = [{"id": ol.id, "book_id": ol.book_id, "type": ol.type, "price": ol.price} for ol in o.order_lines]
             orders_list.append({"id": o.id, "user_id": o.user_id, "total_price": o.total_price, "payment_status": o.payment_status, "order_lines": order_lines, "order_date": o.order_date, "email_sent": o.email_sent})
 
+        page = {"next_cursor": encode_cursor({"order_date": orders[-1].order_date.isoformat(), "id": orders[-1].id}) if has_more else None}
+        if cursor is None:
+            page["current_page"] = page_number
         if include_total:
-            total_count = session.query(Order).filter(*filters).count()
-            return jsonify({"orders": orders_list, "page": {
-                "current_page": page_number,
-                "total_pages": (total_count + page_size - 1) // page_size,
-            }})
-        else:
-            return jsonify({"orders": orders_list, "page": {
-                "current_page": page_number
-            }})
+            total_count, estimated = get_total_count(session, "orders", (status,), session.query(Order).filter(*filters), include_total, filtered=bool(filters))
+            page["total_pages"] = (total_count + page_size - 1) // page_size
+            page["total_is_estimate"] = estimated
+        return conditional_jsonify({"orders": orders_list, "page": page})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
@@ -66,8 +108,50 @@ def get_order_details(context, id):
         order_lines = [{"id": ol.id, "book_id": ol.book_id, "type": ol.type, "price": ol.price} for ol in order.order_lines]
         order_data = {"id": order.id, "user_id": order.user_id, "total_price": order.total_price, "payment_status": order.payment_status, "order_lines": order_lines, "order_date": order.order_date, "email_sent": order.email_sent}
 
-        return jsonify(order_data)
+        return conditional_jsonify(order_data)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        session.close()
+
+
+# Stored bill for an order, available to the customer who placed it and to managers.
+# The gzip-compressed HTML is sent as stored to clients that accept gzip.
+@orders_bp.route("/<int:id>/bill", methods=["GET"])
+@token_required
+def get_order_bill(context, id):
+    session = SessionLocal()
+    try:
+        order = session.get(Order, id)
+        if not order:
+            return jsonify({"error": "Order not found"}), 404
+        if (context.get("role") or "").lower() != "manager" and order.user_id != context['id']:
+            return jsonify({"error": "You do not have access to this bill"}), 403
+
+        bill = session.get(OrderBill, id)
+        if not bill:
+            # Orders placed before bills were stored get theirs rendered once here
+            store_bill(session, order, order.order_lines)
+            try:
+                session.commit()
+            except IntegrityError:
+                # A concurrent request stored the same bill first; use theirs
+                session.rollback()
+            bill = session.get(OrderBill, id)
+
+        if request.accept_encodings["gzip"]:
+            response = current_app.response_class(bill.html_gzip, mimetype="text/html")
+            response.headers["Content-Encoding"] = "gzip"
+        else:
+            response = current_app.response_class(gzip.decompress(bill.html_gzip), mimetype="text/html")
+        response.vary.add("Accept-Encoding")
+        response.set_etag(bill.etag, weak=True)
+        # A bill never changes once rendered
+        response.cache_control.private = True
+        response.cache_control.max_age = 86400
+        return response.make_conditional(request)
     except Exception as e:
+        session.rollback()
         return jsonify({"error": str(e)}), 500
     finally:
         session.close()
@@ -79,44 +163,136 @@ def get_order_details(context, id):
 def create_order(context):
     data = request.json
     user_id = context['id']
+    if not isinstance(data, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
     order_lines_data = data.get("order_lines", [])
 
+    if not order_lines_data:
+        return jsonify({"error": "Order must contain at least one order line"}), 400
+    if not isinstance(order_lines_data, list):
+        return jsonify({"error": "order_lines must be a list"}), 400
+    for ol in order_lines_data:
+        if not isinstance(ol, dict):
+            return jsonify({"error": "Each order line must be an object"}), 400
+        if ol.get('type') not in ('buy', 'rent'):
+            return jsonify({"error": f"Invalid order line type '{ol.get('type')}' and book id {ol.get('book_id')}"}), 400
+        if not isinstance(ol.get('book_id'), int):
+            return jsonify({"error": "Each order line needs an integer book_id"}), 400
+    if len({ol['book_id'] for ol in order_lines_data}) != len(order_lines_data):
+        return jsonify({"error": "Each book may appear only once in an order"}), 400
+
+    for attempt in range(1, ORDER_MAX_ATTEMPTS + 1):
+        session = SessionLocal()
+        try:
+            return _place_order(session, user_id, order_lines_data)
+        except DBAPIError as e:
+            session.rollback()
+            if _is_lock_conflict(e) and attempt < ORDER_MAX_ATTEMPTS:
+                logger.warning("Retrying order after lock conflict", extra={"user_id": user_id, "attempt": attempt, "error": str(e.orig)})
+                time.sleep(random.uniform(0, ORDER_RETRY_BACKOFF_SECONDS * 2 ** attempt))
+                continue
+            return jsonify({"error": str(e)}), 500
+        except Exception as e:
+            session.rollback()
+            return jsonify({"error": str(e)}), 500
+        finally:
+            session.close()
+
+
+def _is_lock_conflict(error):
+    """True for MySQL deadlocks and lock wait timeouts, after which the transaction can be retried."""
+    return getattr(error.orig, "errno", None) in MYSQL_LOCK_CONFLICT_ERRORS
+
+
+def _place_order(session, user_id, order_lines_data):
+    # Lock every requested book in one statement, in id order so concurrent checkouts
+    # of overlapping books queue behind each other instead of deadlocking
+    book_ids = sorted(ol['book_id'] for ol in order_lines_data)
+    books = {b.id: b for b in session.scalars(
+        select(Book)
+        .options(load_only(Book.id, Book.title, Book.status, Book.price_buy, Book.price_rent))
+        .where(Book.id.in_(book_ids))
+        .order_by(Book.id)
+        .with_for_update()
+    )}
+
+    changed_statuses = set()
+    # Calculate each order line price from book prices and type
+    for ol in order_lines_data:
+        book = books.get(ol['book_id'])
+        if not book:
+            session.rollback()
+            return jsonify({"error": f"Book with id {ol['book_id']} not found"}), 404
+        if book.status not in ORDERABLE_STATUSES:
+            session.rollback()
+            return jsonify({"error": f"Book with id {ol['book_id']} is not available"}), 409
+        changed_statuses.add(book.status)
+        ol['price'] = float(book.price_buy if ol['type'] == 'buy' else book.price_rent)
+    sold_ids = [ol['book_id'] for ol in order_lines_data if ol['type'] == 'buy']
+    rented_ids = [ol['book_id'] for ol in order_lines_data if ol['type'] == 'rent']
+
+    # Update book status to 'sold' or 'rented' based on order line type
+    if sold_ids:
+        session.execute(update(Book).where(Book.id.in_(sold_ids)).values(status='sold'))
+        changed_statuses.add('sold')
+    if rented_ids:
+        session.execute(update(Book).where(Book.id.in_(rented_ids)).values(status='rented'))
+        changed_statuses.add('rented')
+
+    # round to 2 decimals
+    total_price = round(sum(ol['price'] for ol in order_lines_data), 2)
+    new_order = Order(user_id=user_id, total_price=total_price)
+    session.add(new_order)
+    session.flush()  # Ensure new_order.id is available
+
+    session.execute(insert(OrderLine), [
+        {"order_id": new_order.id, "book_id": ol['book_id'], "type": ol['type'], "price": ol['price']}
+        for ol in order_lines_data
+    ])
+
+    add_orders(session, [new_order.id])
+
+    # Keep the active rentals ledger in step: any earlier rental of these books ends here
+    session.execute(delete(ActiveRental).where(ActiveRental.book_id.in_(book_ids)))
+    if rented_ids:
+        session.execute(insert(ActiveRental), [{"book_id": book_id, "user_id": user_id} for book_id in rented_ids])
+    record_book_changes(session, book_ids)
+
+    # Render and store the bill after order creation and queue it for the email
+    # worker; both commit or roll back together with the order
+    bill_html = store_bill(session, new_order, new_order.order_lines)
+    user_email = session.get(User, user_id).email
+    order_id = new_order.id
+    enqueue_email(session, user_email, "Your Order Bill", bill_html, order_id=order_id)
+    session.commit()
+    count_cache.invalidate("orders", "books")
+    catalog_cache.invalidate(*book_status_tags(*changed_statuses))
+    for ol in order_lines_data:
+        catalog_index.set_status(ol['book_id'], 'sold' if ol['type'] == 'buy' else 'rented')
+
+    return jsonify({"message": "Order created successfully", "order_id": order_id, "bill_url": url_for("orders.get_order_bill", id=order_id)}), 201
+
+
+@orders_bp.route("/<int:id>/status", methods=["PATCH"])
+@token_required
+@role_required("Manager")
+def update_order_status(context, id):
+    data = request.json
+    new_status = data.get("status")
+    if new_status not in Order.payment_status.type.enums:
+        return jsonify({"error": f"Invalid status '{new_status}'"}), 400
+
     session = SessionLocal()
     try:
-        # Calculate each order line price from book prices and type
-        for ol in order_lines_data:
-            book = session.get(Book, ol['book_id'])
-            if not book:
-                return jsonify({"error": f"Book with id {ol['book_id']} not found"}), 404
-            # Update book status to 'sold' or 'rented' based on order line type
-            if ol['type'] == 'buy':
-                ol['price'] = float(book.price_buy)
-                book.status = 'sold'
-            elif ol['type'] == 'rent':
-                ol['price'] = float(book.price_rent)
-                book.status = 'rented'
-            else:
-                return jsonify({"error": f"Invalid order line type '{ol['type']}' and book id {ol['book_id']}"}), 400
-            
-        # round to 2 decimals
-        total_price = round(sum(ol['price'] for ol in order_lines_data), 2)
-        new_order = Order(user_id=user_id, total_price=total_price)
-        session.add(new_order)
-        session.flush()  # Ensure new_order.id is available
-
-        for ol_data in order_lines_data:
-            new_order_line = OrderLine(order_id=new_order.id, book_id=ol_data['book_id'], type=ol_data['type'], price=ol_data['price'])
-            session.add(new_order_line)
-        session.flush()
-
-        # Generate bill after order creation
-        bill_html = generate_bill(new_order, new_order.order_lines)
-        user_email = session.get(User, user_id).email
-        email_status = send_email(user_email, "Your Order Bill", bill_html)
-        new_order.email_sent = email_status
+        # Lock the order so concurrent updates move its rollup lines one at a time
+        order = session.scalars(select(Order).where(Order.id == id).with_for_update()).first()
+        if not order:
+            return jsonify({"error": "Order not found"}), 404
+        move_orders(session, [id], new_status)
+        order.payment_status = new_status
         session.commit()
-        
-        return jsonify({"message": "Order created successfully", "order_id": new_order.id, "bill": bill_html}), 201
+        count_cache.invalidate("orders")
+        return jsonify({"message": "Order status updated successfully"})
     except Exception as e:
         session.rollback()
         return jsonify({"error": str(e)}), 500
@@ -124,23 +300,57 @@ def create_order(context):
         session.close()
 
 
-@orders_bp.route("/<int:id>/status", methods=["PATCH"])
+# Update the payment status of many orders at once, selected by ids and/or a filter:
+# {"status": "completed", "ids": [1, 2], "filter": {"status": "pending"}}
+@orders_bp.route("/status", methods=["PATCH"])
 @token_required
 @role_required("Manager")
-def update_order_status(context, id):
+def bulk_update_order_status(context):
     data = request.json
+    if not isinstance(data, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
     new_status = data.get("status")
+    ids = data.get("ids")
+    order_filter = data.get("filter") or {}
+
+    if not isinstance(order_filter, dict):
+        return jsonify({"error": "filter must be an object"}), 400
+    if not isinstance(order_filter.get("status") or "", str):
+        return jsonify({"error": "filter.status must be a string"}), 400
+    if not isinstance(order_filter.get("user_id") or 0, int):
+        return jsonify({"error": "filter.user_id must be an integer"}), 400
+    if not isinstance(new_status, str) or new_status not in Order.payment_status.type.enums:
+        return jsonify({"error": f"Invalid status '{new_status}'"}), 400
+    if ids is None and not order_filter:
+        return jsonify({"error": "Provide ids or a filter"}), 400
+
+    filters = []
+    if ids is not None:
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            return jsonify({"error": "ids must be a list of integers"}), 400
+        filters.append(Order.id.in_(ids))
+    if order_filter.get("status"):
+        filters.append(Order.payment_status == order_filter["status"])
+    if order_filter.get("user_id"):
+        filters.append(Order.user_id == order_filter["user_id"])
 
     session = SessionLocal()
     try:
-        order = session.get(Order, id)
-        if not order:
-            return jsonify({"error": "Order not found"}), 404
-        order.payment_status = new_status
+        # Lock the matching rows so the reported ids are exactly the ones updated
+        matched = session.execute(select(Order.id).where(*filters, Order.payment_status != new_status).order_by(Order.id).limit(BULK_STATUS_MAX_ROWS + 1).with_for_update()).scalars().all()
+        if len(matched) > BULK_STATUS_MAX_ROWS:
+            session.rollback()
+            return jsonify({"error": f"More than {BULK_STATUS_MAX_ROWS} orders match, narrow the selection"}), 400
+        if matched:
+            move_orders(session, matched, new_status)
+            session.execute(update(Order).where(Order.id.in_(matched)).values(payment_status=new_status))
         session.commit()
-        return jsonify({"message": "Order status updated successfully"})
+
+        if matched:
+            count_cache.invalidate("orders")
+        return jsonify({"message": "Order statuses updated successfully", "updated_ids": matched})
     except Exception as e:
         session.rollback()
         return jsonify({"error": str(e)}), 500
     finally:
-        session.close()
\ No newline at end of file
+        session.close()
@@ -0,0 +1,85 @@
+# reports.py
+
+from datetime import date, timedelta
+
+from flask import Blueprint, jsonify, request
+from sqlalchemy import func, select
+from api.auth import role_required, token_required
+from api.services.conditional import conditional_jsonify
+from utils.db import SessionLocal
+from utils.models import Author, Keyword, SalesDaily, SalesDailyAuthor, SalesDailyKeyword
+
+reports_bp = Blueprint("reports", __name__, url_prefix="/api/v1/reports")
+
+DEFAULT_REPORT_DAYS = 30
+REPORT_TOP_LIMIT = 20
+REPORT_MAX_TOP_LIMIT = 100
+# Cancelled orders are left out of revenue unless asked for
+DEFAULT_REPORT_STATUSES = ["pending", "completed"]
+
+
+# Sales totals for a date range, read only from the daily rollup tables.
+# ?start=2025-01-01&end=2025-01-31&group_by=day|type|author|keyword&status=completed&type=rent&limit=20
+@reports_bp.route("/sales", methods=["GET"])
+@token_required
+@role_required("Manager")
+def get_sales_report(context):
+    try:
+        end = date.fromisoformat(request.args["end"]) if request.args.get("end") else date.today()
+        start = date.fromisoformat(request.args["start"]) if request.args.get("start") else end - timedelta(days=DEFAULT_REPORT_DAYS - 1)
+    except ValueError:
+        return jsonify({"error": "start and end must be dates in YYYY-MM-DD format"}), 400
+    if start > end:
+        return jsonify({"error": "start must not be after end"}), 400
+
+    group_by = request.args.get("group_by", "day")
+    if group_by not in ("day", "type", "author", "keyword"):
+        return jsonify({"error": f"Invalid group_by '{group_by}'"}), 400
+    statuses = request.args.getlist("status") or DEFAULT_REPORT_STATUSES
+    if not set(statuses) <= set(SalesDaily.payment_status.type.enums):
+        return jsonify({"error": "Invalid status filter"}), 400
+    line_type = request.args.get("type")
+    if line_type not in (None, "buy", "rent"):
+        return jsonify({"error": f"Invalid type '{line_type}'"}), 400
+    limit = min(request.args.get("limit", REPORT_TOP_LIMIT, type=int), REPORT_MAX_TOP_LIMIT)
+
+    session = SessionLocal()
+    try:
+        def measures(model):
+            return func.sum(model.line_count).label("line_count"), func.sum(model.revenue).label("revenue")
+
+        def filtered(query, model):
+            query = query.where(model.day.between(start, end), model.payment_status.in_(statuses))
+            return query.where(model.type == line_type) if line_type else query
+
+        total = session.execute(filtered(select(*measures(SalesDaily)), SalesDaily)).one()
+
+        if group_by in ("day", "type"):
+            column = SalesDaily.day if group_by == "day" else SalesDaily.type
+            rows = session.execute(filtered(select(column, *measures(SalesDaily)), SalesDaily).group_by(column).order_by(column)).all()
+            rows = [{group_by: value.isoformat() if group_by == "day" else value, "line_count": int(count), "revenue": revenue} for value, count, revenue in rows]
+        else:
+            # Top authors or keywords by revenue; names are looked up for the top rows only
+            model, key, name_model, name_column = (
+                (SalesDailyAuthor, SalesDailyAuthor.author_id, Author, Author.name) if group_by == "author"
+                else (SalesDailyKeyword, SalesDailyKeyword.keyword_id, Keyword, Keyword.word)
+            )
+            line_count, revenue = measures(model)
+            top = session.execute(filtered(select(key, line_count, revenue), model).group_by(key).order_by(revenue.desc(), key).limit(limit)).all()
+            names = dict(session.execute(select(name_model.id, name_column).where(name_model.id.in_([row[0] for row in top]))).all()) if top else {}
+            label = "author" if group_by == "author" else "keyword"
+            rows = [{f"{label}_id": value, label: names.get(value), "line_count": int(count), "revenue": revenue} for value, count, revenue in top]
+
+        return conditional_jsonify({
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "statuses": statuses,
+            "type": line_type,
+            "group_by": group_by,
+            "totals": {"line_count": int(total.line_count or 0), "revenue": total.revenue or 0},
+            "rows": rows,
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        session.close()
@@ -1,13 +1,17 @@
 # books.py
 
-import datetime
-import bcrypt
+from datetime import datetime
 from flask import Blueprint, jsonify, request
 from sqlalchemy import select
 from api.auth import role_required, token_required
+from api.services.counts import count_cache, parse_include_total, get_total_count
+from api.services.password_hashing import HashingPoolBusy, password_hasher
+from api.services.revocation import revocation_list
+from api.services.tokens import InvalidRefreshToken, create_access_token, issue_refresh_token, purge_expired_refresh_tokens, revoke_refresh_token, rotate_refresh_token
+from api.services.user_cache import user_cache
 from utils.db import SessionLocal
 from utils.models import User
-from utils.config import Config
+from utils.config import decode_token
 # from auth import current_user
 import jwt
 
@@ -22,7 +26,7 @@ def get_users(context):
     page_number = request.args.get("page_number", 1, type=int)
     page_size = request.args.get("page_size", 100, type=int)
     role = request.args.get("role", None)
-    include_total = request.args.get("include_total", "false").lower() == "true"
+    include_total = parse_include_total(request.args.get("include_total"))
 
     filters = []
 
@@ -37,10 +41,11 @@ def get_users(context):
 
         users_list = [{"id": u.id, "username": u.username, "email": u.email, "role": u.role} for u in users]
         if include_total:
-            total_count = session.query(User).filter(*filters).count()
+            total_count, estimated = get_total_count(session, "users", (role,), session.query(User).filter(*filters), include_total, filtered=bool(filters))
             return jsonify({"users": users_list, "page": {
                 "current_page": page_number,
                 "total_pages": (total_count + page_size - 1) // page_size,
+                "total_is_estimate": estimated,
             }})
         return jsonify({"users": users_list, "page": {
             "current_page": page_number
@@ -51,6 +56,28 @@ def get_users(context):
         session.close()
 
 
+# Hit/miss counters of the user cache consulted by token_required
+@users_bp.route("/auth_cache_stats", methods=["GET"])
+@token_required
+@role_required("Manager")
+def get_auth_cache_stats(context):
+    return jsonify(user_cache.stats())
+
+
+@users_bp.route("/password_hashing_stats", methods=["GET"])
+@token_required
+@role_required("Manager")
+def get_password_hashing_stats(context):
+    return jsonify(password_hasher.stats())
+
+
+@users_bp.route("/revocation_stats", methods=["GET"])
+@token_required
+@role_required("Manager")
+def get_revocation_stats(context):
+    return jsonify(revocation_list.stats())
+
+
 @users_bp.route("/<int:id>", methods=["GET"])
 @token_required
 @role_required("Manager")
@@ -88,24 +115,93 @@ def login():
     data = request.json
     username = data.get("username")
     password = data.get("password")
+    if not username or not password:
+        return jsonify({"error": "username and password are required"}), 400
 
     session = SessionLocal()
     try:
-        user = session.query(User).filter_by(username=username).first()
-        if user and bcrypt.checkpw(password.encode("utf-8"), user.password_hash.encode("utf-8")):
-            # Create token
-            token = jwt.encode({"id": user.id, "role": user.role, "exp": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=30)}, Config.JWT_SECRET_KEY, algorithm="HS256")
-            # Return user token in response
-            return jsonify({"message": "Login successful", "token": token})
+        user = session.query(User.id, User.role, User.password_hash).filter_by(username=username).first()
+        # Hand the connection back to the pool while bcrypt runs
+        session.rollback()
+        if user and password_hasher.verify(password, user.password_hash):
+            # Upgrade hashes made with another cost now that the password is known
+            if password_hasher.needs_rehash(user.password_hash):
+                try:
+                    session.query(User).filter_by(id=user.id).update({"password_hash": password_hasher.hash(password)})
+                    session.commit()
+                except HashingPoolBusy:
+                    # The upgrade can wait for the next login
+                    pass
+            # Create tokens; the refresh token renews the access token without a password
+            token = create_access_token(user.id, user.role)
+            purge_expired_refresh_tokens(session, user.id)
+            refresh_token = issue_refresh_token(session, user.id)
+            session.commit()
+            # Return user tokens in response
+            return jsonify({"message": "Login successful", "token": token, "refresh_token": refresh_token})
         else:
             return jsonify({"error": "Invalid credentials"}), 401
+    except HashingPoolBusy as e:
+        return jsonify({"error": str(e)}), e.status, {"Retry-After": "1"}
     finally:
         session.close()
 
 
-# Logout will be handled client-side by deleting the token
+# Swap a refresh token for a new access token and the next refresh token.
+# The presented refresh token stops working; reusing it revokes the whole session.
+@users_bp.route("/refresh", methods=["POST"])
+def refresh():
+    refresh_token = (request.json or {}).get("refresh_token")
+    if not refresh_token:
+        return jsonify({"error": "refresh_token is required"}), 400
+
+    session = SessionLocal()
+    try:
+        user_id, next_refresh_token = rotate_refresh_token(session, refresh_token)
+        # The role is read fresh so that a role change reaches the new access token
+        role = user_cache.get(user_id) or session.query(User.role).filter_by(id=user_id).scalar()
+        if role is None:
+            session.rollback()
+            return jsonify({"error": "User not found"}), 401
+        session.commit()
+        return jsonify({"token": create_access_token(user_id, role), "refresh_token": next_refresh_token})
+    except InvalidRefreshToken as e:
+        # Keep the family revocation made on reuse
+        session.commit()
+        return jsonify({"error": str(e)}), 401
+    except Exception as e:
+        session.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        session.close()
+
+
+# Revokes the access token in the Authorization header and, if sent, the refresh token
 @users_bp.route("/logout", methods=["POST"])
 def logout():
+    token = request.headers.get("Authorization")
+    refresh_token = (request.get_json(silent=True) or {}).get("refresh_token")
+    try:
+        if token:
+            try:
+                data = decode_token(token)
+            except jwt.InvalidTokenError:
+                # Expired or invalid tokens are rejected anyway
+                data = {}
+            if data.get("jti"):
+                revocation_list.revoke(data["jti"], datetime.fromtimestamp(data["exp"]))
+        if refresh_token:
+            session = SessionLocal()
+            try:
+                revoke_refresh_token(session, refresh_token)
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
     return jsonify({"message": "Logged out"})
 
 
@@ -126,16 +222,21 @@ def register():
         existing_user = session.query(User).filter((User.username == username) | (User.email == email)).first()
         if existing_user:
             return jsonify({"error": "Username or email already exists"}), 400
+        # Hand the connection back to the pool while bcrypt runs
+        session.rollback()
 
         # Hash the password
-        password_hash = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=12)).decode("utf-8")
+        password_hash = password_hasher.hash(password)
 
         # Create new user
         new_user = User(username=username, email=email, password_hash=password_hash, role=role, first_name=first_name, last_name=last_name)
         session.add(new_user)
         session.commit()
+        count_cache.invalidate("users")
 
         return jsonify({"message": "User registered successfully", "user_id": new_user.id}), 201
+    except HashingPoolBusy as e:
+        return jsonify({"error": str(e)}), e.status, {"Retry-After": "1"}
     except Exception as e:
         session.rollback()
         return jsonify({"error": str(e)}), 500
@@ -1,4 +1,25 @@
-from flask import render_template
+import gzip
+import hashlib
+import os
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from utils.models import OrderBill
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates")
+
+# Compiled once when the module is imported instead of on the request path
+_environment = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=select_autoescape(["html"]))
+BILL_TEMPLATE = _environment.get_template("bill.html")
+
 
 def generate_bill(order, order_lines):
-    return render_template("bill.html", order=order, order_lines=order_lines)
\ No newline at end of file
+    return BILL_TEMPLATE.render(order=order, order_lines=order_lines)
+
+
+def store_bill(session, order, order_lines):
+    """Render the bill for order, add it to the session gzip-compressed, and return the HTML."""
+    bill_html = generate_bill(order, order_lines)
+    data = bill_html.encode("utf-8")
+    etag = hashlib.sha256(data).hexdigest()[:32]
+    session.add(OrderBill(order_id=order.id, html_gzip=gzip.compress(data, mtime=0), etag=etag))
+    return bill_html
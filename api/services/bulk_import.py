@@ -0,0 +1,194 @@
+import csv
+import io
+import json
+
+from sqlalchemy import insert, select
+from utils.models import Author, Book, BookKeyword, Keyword
+
+BULK_CHUNK_SIZE = 1000
+BULK_MAX_CHUNK_SIZE = 5000
+# Separator for the keywords column in CSV input
+CSV_KEYWORD_SEPARATOR = ";"
+
+
+def parse_rows(body, content_type):
+    """Parse a bulk import body into a list of (row_number, record) pairs.
+
+    Accepts JSON Lines (application/x-ndjson, application/jsonl), CSV (text/csv) or a
+    JSON array. Lines that cannot be parsed are returned as (row_number, error) with
+    a string error in place of the record.
+    """
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    text = body.decode("utf-8-sig")
+    if content_type == "text/csv":
+        rows = []
+        for number, record in enumerate(csv.DictReader(io.StringIO(text)), start=1):
+            record["keywords"] = (record.get("keywords") or "").split(CSV_KEYWORD_SEPARATOR)
+            rows.append((number, {k: v for k, v in record.items() if v not in (None, "")}))
+        return rows
+    if content_type == "application/json":
+        records = json.loads(text)
+        if not isinstance(records, list):
+            raise ValueError("a JSON body must be an array of book objects")
+        return list(enumerate(records, start=1))
+
+    rows = []
+    for number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            rows.append((number, json.loads(line)))
+        except ValueError as e:
+            rows.append((number, f"Invalid JSON: {e}"))
+    return rows
+
+
+def _validate(record):
+    """Return a normalized book record, or raise ValueError describing the problem."""
+    if not isinstance(record, dict):
+        raise ValueError(record if isinstance(record, str) else "Row must be an object")
+    title = record.get("title") or ""
+    if not isinstance(title, str):
+        raise ValueError("title must be a string")
+    title = title.strip()
+    if not title:
+        raise ValueError("title is required")
+    try:
+        price_buy = round(float(record["price_buy"]), 2)
+        price_rent = round(float(record["price_rent"]), 2)
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Both price_buy and price_rent must be provided as numbers")
+    if price_buy < 0 or price_rent < 0:
+        raise ValueError("Prices must be non-negative")
+    author_id = record.get("author_id")
+    if author_id is not None:
+        try:
+            author_id = int(author_id)
+        except (TypeError, ValueError):
+            raise ValueError("author_id must be an integer")
+    author_name = record.get("author_name") or "Unknown Author"
+    if not isinstance(author_name, str):
+        raise ValueError("author_name must be a string")
+    keywords = record.get("keywords") or []
+    if isinstance(keywords, str):
+        keywords = [keywords]
+    if not isinstance(keywords, list) or not all(w is None or isinstance(w, str) for w in keywords):
+        raise ValueError("keywords must be a list of strings")
+    return {
+        "title": title,
+        "author_id": author_id,
+        "author_name": author_name.strip(),
+        "author_bio": record.get("author_bio", "No bio available"),
+        "price_buy": price_buy,
+        "price_rent": price_rent,
+        "description": record.get("description"),
+        "keywords": list(dict.fromkeys(w.strip() for w in keywords if w and w.strip())),
+    }
+
+
+def _resolve_authors(session, records):
+    """Fill in author_id for records given by author name, creating missing authors
+    with one executemany. Records naming an unknown author_id get an error."""
+    wanted_ids = {r["author_id"] for r in records if r["author_id"] is not None}
+    known_ids = set(session.scalars(select(Author.id).where(Author.id.in_(wanted_ids)))) if wanted_ids else set()
+
+    names = {r["author_name"] for r in records if r["author_id"] is None}
+    by_name = {}
+    if names:
+        for author_id, name in session.execute(select(Author.id, Author.name).where(Author.name.in_(names)).order_by(Author.id)):
+            by_name.setdefault(name, author_id)
+        bios = {}
+        for r in records:
+            if r["author_id"] is None and r["author_name"] not in by_name:
+                bios.setdefault(r["author_name"], r["author_bio"])
+        if bios:
+            session.execute(insert(Author), [{"name": n, "bio": b} for n, b in bios.items()])
+            for author_id, name in session.execute(select(Author.id, Author.name).where(Author.name.in_(bios)).order_by(Author.id)):
+                by_name.setdefault(name, author_id)
+
+    for r in records:
+        if r["author_id"] is None:
+            r["author_id"] = by_name[r["author_name"]]
+        elif r["author_id"] not in known_ids:
+            r["error"] = f"Author with id {r['author_id']} not found"
+
+
+def _resolve_keywords(session, records):
+    """Map every keyword used in records to its id, inserting missing ones with INSERT IGNORE."""
+    words = {w for r in records for w in r["keywords"]}
+    if not words:
+        return {}
+    stmt = insert(Keyword).prefix_with("IGNORE", dialect="mysql").prefix_with("OR IGNORE", dialect="sqlite")
+    session.execute(stmt, [{"word": w} for w in words])
+    # keywords.word compares case-insensitively on MySQL, so key the lookup the same way
+    return {word.lower(): keyword_id for keyword_id, word in session.execute(select(Keyword.id, Keyword.word).where(Keyword.word.in_(words)))}
+
+
+def _insert_books(session, rows):
+    """Insert book rows in one statement and return their ids in input order."""
+    dialect = session.get_bind().dialect
+    if dialect.insert_executemany_returning_sort_by_parameter_order:
+        return list(session.scalars(insert(Book).returning(Book.id, sort_by_parameter_order=True), rows))
+
+    # No RETURNING on MySQL: a multi-row INSERT reports the id of its first row and
+    # assigns increasing ids in row order. Concurrent inserts may interleave with ours
+    # (innodb_autoinc_lock_mode=2), so match rows back by title and author in id order.
+    first_id = session.execute(insert(Book).values(rows)).lastrowid
+    found = session.execute(
+        select(Book.id, Book.title, Book.author_id)
+        .where(Book.id >= first_id, Book.title.in_({r["title"] for r in rows}))
+        .order_by(Book.id)
+    ).all()
+    ids = []
+    for book in found:
+        if len(ids) == len(rows):
+            break
+        expected = rows[len(ids)]
+        if (book.title, book.author_id) == (expected["title"], expected["author_id"]):
+            ids.append(book.id)
+    if len(ids) != len(rows):
+        raise RuntimeError("Could not match inserted books to their ids")
+    return ids
+
+
+def import_chunk(session, numbered_records):
+    """Import one chunk of (row_number, record) pairs in the session's transaction.
+
+    Returns (created, errors): created holds dicts with the new book's id, row,
+    title, author_id and keywords; errors holds {"row", "error"} for rejected rows.
+    The caller commits.
+    """
+    errors = []
+    records = []
+    for number, record in numbered_records:
+        try:
+            valid = _validate(record)
+        except ValueError as e:
+            errors.append({"row": number, "error": str(e)})
+            continue
+        valid["row"] = number
+        records.append(valid)
+    if not records:
+        return [], errors
+
+    _resolve_authors(session, records)
+    errors.extend({"row": r["row"], "error": r["error"]} for r in records if "error" in r)
+    records = [r for r in records if "error" not in r]
+    if not records:
+        return [], errors
+
+    keyword_ids = _resolve_keywords(session, records)
+    book_ids = _insert_books(session, [
+        {"title": r["title"], "author_id": r["author_id"], "price_buy": r["price_buy"], "price_rent": r["price_rent"], "description": r["description"]}
+        for r in records
+    ])
+
+    links = {}
+    for book_id, r in zip(book_ids, records):
+        for word in r["keywords"]:
+            links[(book_id, keyword_ids[word.lower()])] = None
+    if links:
+        session.execute(insert(BookKeyword), [{"book_id": b, "keyword_id": k} for b, k in links])
+
+    created = [{"id": book_id, "row": r["row"], "title": r["title"], "author_id": r["author_id"], "keywords": r["keywords"]} for book_id, r in zip(book_ids, records)]
+    return created, errors
@@ -0,0 +1,382 @@
+import heapq
+import logging
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select
+from api.services.counts import count_cache
+from api.services.response_cache import book_status_tags, catalog_cache
+from utils.db import SessionLocal
+from utils.models import Book, BookKeyword, CatalogChange, Keyword
+
+BOOK_STATUSES = ("new", "rented", "sold", "returned")
+# Per-book status is kept as one byte: 0 for an unknown book, else index + 1
+_STATUS_CODES = {status: code for code, status in enumerate(BOOK_STATUSES, 1)}
+# How often each worker replays catalog_changes rows written by other workers
+CATALOG_REFRESH_SECONDS = 2
+# Rows below the last id seen that are read again on each refresh, in case a row
+# with a lower id was committed after a higher one
+CATALOG_REFRESH_OVERLAP = 100
+CATALOG_REFRESH_BATCH = 5000
+# A worker only replays rows written after it loaded, so old rows can go
+CATALOG_CHANGES_KEEP = timedelta(hours=1)
+CATALOG_PURGE_SECONDS = 600
+# Filtered facet counts walk the matching books directly below this many matches
+# and AND every keyword bitset against them above it
+SPARSE_FACET_LIMIT = 5000
+
+logger = logging.getLogger(__name__)
+
+
+def _bits_to_ids(bits):
+    """Return the positions of the set bits in bits, in ascending order."""
+    digits = bin(bits)[:1:-1]
+    ids = []
+    position = digits.find("1")
+    while position != -1:
+        ids.append(position)
+        position = digits.find("1", position + 1)
+    return ids
+
+
+def _ids_to_bits(ids):
+    """Build a bitset from many ids in linear time (OR-ing shifted ints one by one
+    copies the whole bitset on every step)."""
+    buffer = bytearray()
+    for book_id in ids:
+        byte = book_id >> 3
+        if byte >= len(buffer):
+            buffer.extend(bytes(byte + 1 - len(buffer)))
+        buffer[byte] |= 1 << (book_id & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def _normalize(words):
+    return {(w or "").strip().lower() for w in words or ()} - {""}
+
+
+def record_book_changes(session, book_ids):
+    """Log books whose status, author or keywords changed, in the caller's
+    transaction, so every worker's catalog index picks the change up."""
+    rows = [{"book_id": book_id} for book_id in book_ids]
+    if rows:
+        session.execute(insert(CatalogChange), rows)
+
+
+class CatalogIndex:
+    """In-memory index over the catalog: keyword, status and author -> book ids.
+
+    Each keyword and status maps to a Python int whose set bits are the ids of its
+    books, so AND/OR/NOT filters are single big-int operations. Authors have few
+    books each, so they map to a sorted array of book ids instead of a bitset sized
+    to the highest book id; a filter turns only the requested authors' ids into a
+    bitset. Per-book status and author are kept in flat arrays indexed by book id,
+    and per-book keywords as tuples of shared strings, only for books that have any. Book
+    counts per (keyword, status) and per status are kept alongside, so facets
+    filtered by status alone are answered from those counts. Keywords are matched
+    case-insensitively, like the MySQL collation on keywords.word.
+
+    The index is loaded on first use and kept current by the write endpoints
+    through add_book(), set_keywords(), set_status() and set_author(). Writes made
+    by other workers reach it through the catalog_changes table, which a background
+    thread replays every CATALOG_REFRESH_SECONDS.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._bitmaps = defaultdict(int)
+        self._keyword_status_counts = defaultdict(lambda: dict.fromkeys(BOOK_STATUSES, 0))
+        self._book_keywords = {}
+        self._words = {}
+        self._status_bitmaps = dict.fromkeys(BOOK_STATUSES, 0)
+        self._status_counts = dict.fromkeys(BOOK_STATUSES, 0)
+        self._book_status = bytearray()
+        self._author_books = defaultdict(lambda: array("i"))
+        self._book_author = array("i")
+        self._all_books = 0
+        self._last_change_id = 0
+        self._poller_pid = None
+        self._next_purge = 0.0
+
+    def _load(self, session):
+        # Changes committed from here on are replayed by refresh(); replaying one
+        # that the load below already saw is harmless
+        self._last_change_id = session.scalar(select(func.max(CatalogChange.id))) or 0
+        size = (session.scalar(select(func.max(Book.id))) or 0) + 1
+        self._book_status = bytearray(size)
+        self._book_author = array("i", bytes(4 * size))
+        status_ids = defaultdict(list)
+        # In id order, so every author's array is built already sorted
+        for book_id, status, author_id in session.query(Book.id, Book.status, Book.author_id).order_by(Book.id).yield_per(10000):
+            status_ids[status].append(book_id)
+            self._author_books[author_id].append(book_id)
+            self._store(self._book_status, book_id, _STATUS_CODES[status])
+            self._store(self._book_author, book_id, author_id)
+        for status, ids in status_ids.items():
+            self._status_bitmaps[status] = _ids_to_bits(ids)
+            self._status_counts[status] = len(ids)
+            self._all_books |= self._status_bitmaps[status]
+
+        keyword_ids = defaultdict(list)
+        book_keywords = defaultdict(list)
+        rows = session.query(BookKeyword.book_id, Keyword.word).join(Keyword, BookKeyword.keyword_id == Keyword.id).yield_per(10000)
+        for book_id, word in rows:
+            word = self._word(word.lower())
+            keyword_ids[word].append(book_id)
+            book_keywords[book_id].append(word)
+        self._book_keywords = {book_id: tuple(words) for book_id, words in book_keywords.items()}
+        for word, ids in keyword_ids.items():
+            self._bitmaps[word] = _ids_to_bits(ids)
+            counts = self._keyword_status_counts[word]
+            for book_id in ids:
+                status = self._status_of(book_id)
+                if status is not None:
+                    counts[status] += 1
+        self._loaded = True
+
+    @staticmethod
+    def _store(values, book_id, value):
+        """values[book_id] = value, growing the array with zeros as needed."""
+        if book_id >= len(values):
+            values.extend([0] * (book_id + 1 - len(values)))
+        values[book_id] = value
+
+    def _status_of(self, book_id):
+        code = self._book_status[book_id] if book_id < len(self._book_status) else 0
+        return BOOK_STATUSES[code - 1] if code else None
+
+    def _author_of(self, book_id):
+        author_id = self._book_author[book_id] if book_id < len(self._book_author) else 0
+        return author_id or None
+
+    def _word(self, word):
+        """One shared string per keyword, rather than one per book that has it."""
+        return self._words.setdefault(word, word)
+
+    def _ensure_loaded(self, session):
+        if not self._loaded:
+            self._load(session)
+        # Started here rather than at import so that each forked worker gets its own
+        if self._poller_pid != os.getpid():
+            self._poller_pid = os.getpid()
+            threading.Thread(target=self._poll, name="catalog-index-refresh", daemon=True).start()
+
+    def _poll(self):
+        while True:
+            time.sleep(CATALOG_REFRESH_SECONDS)
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Could not refresh the catalog index")
+
+    def refresh(self):
+        """Apply catalog_changes rows added since the last refresh, re-reading the
+        status, author and keywords of the books they name.
+
+        The writing worker invalidated only its own response and count caches, so
+        cached book lists and counts are invalidated here for every replayed book
+        whose state differs from this worker's. Rows that were already applied
+        (including this worker's own writes) change nothing and invalidate nothing.
+        """
+        session = SessionLocal()
+        try:
+            changes = session.execute(
+                select(CatalogChange.id, CatalogChange.book_id)
+                .where(CatalogChange.id > self._last_change_id - CATALOG_REFRESH_OVERLAP)
+                .order_by(CatalogChange.id)
+                .limit(CATALOG_REFRESH_BATCH)
+            ).all()
+            book_ids = {book_id for _, book_id in changes}
+            if book_ids:
+                books = session.execute(select(Book.id, Book.status, Book.author_id).where(Book.id.in_(book_ids))).all()
+                words = defaultdict(list)
+                rows = session.execute(
+                    select(BookKeyword.book_id, Keyword.word)
+                    .join(Keyword, BookKeyword.keyword_id == Keyword.id)
+                    .where(BookKeyword.book_id.in_(book_ids))
+                )
+                for book_id, word in rows:
+                    words[book_id].append(word)
+                changed_statuses = set()
+                other_change = False
+                with self._lock:
+                    for book_id, status, author_id in books:
+                        book_words = _normalize(words.get(book_id))
+                        current_status = self._status_of(book_id)
+                        if current_status != status:
+                            changed_statuses.update((current_status, status))
+                        if self._author_of(book_id) != author_id or set(self._book_keywords.get(book_id, ())) != book_words:
+                            other_change = True
+                        self._apply(book_id, status, author_id, book_words)
+                    self._last_change_id = max(self._last_change_id, changes[-1].id)
+                if other_change:
+                    count_cache.invalidate("books")
+                    catalog_cache.invalidate("books")
+                elif changed_statuses:
+                    count_cache.invalidate("books")
+                    catalog_cache.invalidate(*book_status_tags(*changed_statuses))
+            if time.monotonic() >= self._next_purge:
+                self._next_purge = time.monotonic() + CATALOG_PURGE_SECONDS
+                session.execute(delete(CatalogChange).where(CatalogChange.changed_at < datetime.now() - CATALOG_CHANGES_KEEP))
+                session.commit()
+        finally:
+            session.close()
+
+    def _apply(self, book_id, status, author_id, words):
+        self._all_books |= 1 << book_id
+        self._set_status(book_id, status)
+        self._set_author(book_id, author_id)
+        self._set_keywords(book_id, words)
+
+    def _set_keywords(self, book_id, words):
+        bit = 1 << book_id
+        status = self._status_of(book_id)
+        current = set(self._book_keywords.get(book_id, ()))
+        for word in current - words:
+            self._bitmaps[word] &= ~bit
+            if status is not None:
+                self._keyword_status_counts[word][status] -= 1
+        for word in words - current:
+            self._bitmaps[word] |= bit
+            if status is not None:
+                self._keyword_status_counts[word][status] += 1
+        if words:
+            self._book_keywords[book_id] = tuple(self._word(w) for w in words)
+        else:
+            self._book_keywords.pop(book_id, None)
+
+    def _set_status(self, book_id, status):
+        bit = 1 << book_id
+        current = self._status_of(book_id)
+        if current == status:
+            return
+        if current is not None:
+            self._status_bitmaps[current] &= ~bit
+            self._status_counts[current] -= 1
+        self._status_bitmaps[status] |= bit
+        self._status_counts[status] += 1
+        for word in self._book_keywords.get(book_id, ()):
+            counts = self._keyword_status_counts[word]
+            if current is not None:
+                counts[current] -= 1
+            counts[status] += 1
+        self._store(self._book_status, book_id, _STATUS_CODES[status])
+
+    def _set_author(self, book_id, author_id):
+        current = self._author_of(book_id)
+        if current == author_id:
+            return
+        if current is not None:
+            books = self._author_books[current]
+            position = bisect_left(books, book_id)
+            if position < len(books) and books[position] == book_id:
+                del books[position]
+        insort(self._author_books[author_id], book_id)
+        self._store(self._book_author, book_id, author_id)
+
+    def add_book(self, book_id, status, author_id, words):
+        """Record a newly created book. The update methods are no-ops until loaded."""
+        with self._lock:
+            if self._loaded:
+                self._apply(book_id, status, int(author_id), _normalize(words))
+
+    def set_keywords(self, book_id, words):
+        """Record the full keyword set of an updated book."""
+        with self._lock:
+            if self._loaded:
+                self._set_keywords(book_id, _normalize(words))
+
+    def set_status(self, book_id, status):
+        with self._lock:
+            if self._loaded:
+                self._set_status(book_id, status)
+
+    def set_author(self, book_id, author_id):
+        with self._lock:
+            if self._loaded:
+                self._set_author(book_id, int(author_id))
+
+    def _keyword_bits(self, all_of, any_of, none_of):
+        result = self._all_books
+        for word in all_of:
+            result &= self._bitmaps.get(word, 0)
+        if any_of:
+            matched = 0
+            for word in any_of:
+                matched |= self._bitmaps.get(word, 0)
+            result &= matched
+        for word in none_of:
+            result &= ~self._bitmaps.get(word, 0)
+        return result
+
+    def _author_bits(self, author_ids):
+        ids = []
+        for author_id in author_ids:
+            ids.extend(self._author_books.get(int(author_id), ()))
+        return _ids_to_bits(ids)
+
+    def _status_bits(self, statuses):
+        bits = 0
+        for status in statuses:
+            bits |= self._status_bitmaps.get(status, 0)
+        return bits
+
+    def query(self, session, all_of=(), any_of=(), none_of=(), statuses=None, author_ids=None):
+        """Return the sorted ids of books that have every keyword in all_of, at least
+        one keyword in any_of and none of the keywords in none_of, restricted to the
+        given statuses and authors when those are not None."""
+        all_of, any_of, none_of = _normalize(all_of), _normalize(any_of), _normalize(none_of)
+        with self._lock:
+            self._ensure_loaded(session)
+            result = self._keyword_bits(all_of, any_of, none_of)
+            if statuses is not None:
+                result &= self._status_bits(statuses)
+            if author_ids is not None:
+                result &= self._author_bits(author_ids)
+        return _bits_to_ids(result)
+
+    def _count_keywords(self, candidates):
+        if candidates.bit_count() <= SPARSE_FACET_LIMIT:
+            return Counter(w for book_id in _bits_to_ids(candidates) for w in self._book_keywords.get(book_id, ())).items()
+        return [(w, (candidates & bits).bit_count()) for w, bits in self._bitmaps.items()]
+
+    def facets(self, session, statuses=None, author_ids=None, book_ids=None, all_of=(), any_of=(), none_of=(), top_keywords=10):
+        """Count books per status and the top keywords among books matching the filters.
+
+        Status counts ignore the status filter itself so the caller can show how
+        many books each status choice would return; keyword counts apply every
+        filter. author_ids and book_ids (e.g. title search matches) restrict the
+        candidates when given.
+        """
+        all_of, any_of, none_of = _normalize(all_of), _normalize(any_of), _normalize(none_of)
+        extra_bits = _ids_to_bits(book_ids) if book_ids is not None else None
+        with self._lock:
+            self._ensure_loaded(session)
+            if not (all_of or any_of or none_of or author_ids is not None or extra_bits is not None):
+                status_counts = dict(self._status_counts)
+                counted_statuses = statuses or BOOK_STATUSES
+                keyword_counts = [(w, sum(counts[s] for s in counted_statuses if s in counts)) for w, counts in self._keyword_status_counts.items()]
+            else:
+                candidates = self._keyword_bits(all_of, any_of, none_of)
+                if author_ids is not None:
+                    candidates &= self._author_bits(author_ids)
+                if extra_bits is not None:
+                    candidates &= extra_bits
+                status_counts = {s: (candidates & bits).bit_count() for s, bits in self._status_bitmaps.items()}
+                if statuses:
+                    candidates &= self._status_bits(statuses)
+                keyword_counts = self._count_keywords(candidates)
+            top = heapq.nlargest(top_keywords, ((c, w) for w, c in keyword_counts if c > 0))
+        return {
+            "status": status_counts,
+            "keywords": [{"word": w, "count": c} for c, w in top],
+        }
+
+
+catalog_index = CatalogIndex()
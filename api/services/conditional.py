@@ -0,0 +1,21 @@
+from flask import current_app, jsonify, request
+
+
+def json_body(payload):
+    """Serialize payload exactly as jsonify would, for caching the bytes."""
+    return jsonify(payload).get_data()
+
+
+def conditional_response(body):
+    """Wrap a serialized JSON body with a weak ETag, answering 304 Not Modified
+    when the client's If-None-Match still matches."""
+    response = current_app.response_class(body, mimetype=current_app.json.mimetype)
+    response.add_etag(weak=True)
+    # Authenticated data: clients may keep it but must revalidate before reuse
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def conditional_jsonify(payload):
+    return conditional_response(json_body(payload))
@@ -0,0 +1,104 @@
+import threading
+import time
+
+from sqlalchemy import text
+
+# Upper bound on staleness for workers that did not see the write themselves
+COUNT_TTL_SECONDS = 60
+
+
+def parse_include_total(value):
+    """Map the include_total query parameter to None, "exact" or "estimate"."""
+    value = (value or "false").lower()
+    if value == "estimate":
+        return "estimate"
+    return "exact" if value == "true" else None
+
+
+class CountCache:
+    """Exact row counts keyed by table and a normalized filter signature.
+
+    Entries expire after `ttl` seconds and are dropped by invalidate() whenever a
+    write touches their table.
+    """
+
+    def __init__(self, ttl=COUNT_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._generations = {}
+
+    def generation(self, table):
+        with self._lock:
+            return self._generations.get(table, 0)
+
+    def get(self, table, signature):
+        with self._lock:
+            entry = self._entries.get((table, signature))
+            if entry is None:
+                return None
+            count, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[(table, signature)]
+                return None
+            return count
+
+    def set(self, table, signature, count, generation):
+        with self._lock:
+            # Skip counts that raced with a write to the table
+            if self._generations.get(table, 0) != generation:
+                return
+            self._entries[(table, signature)] = (count, time.monotonic() + self.ttl)
+
+    def invalidate(self, *tables):
+        with self._lock:
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+            for key in [k for k in self._entries if k[0] in tables]:
+                del self._entries[key]
+
+
+count_cache = CountCache()
+
+
+def _estimate_count(session, table, query, filtered):
+    """Estimate the row count of query from MySQL statistics, or None if unavailable."""
+    if session.get_bind().dialect.name != "mysql":
+        return None
+    if not filtered:
+        row = session.execute(
+            text("SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = :table"),
+            {"table": table},
+        ).first()
+        return int(row[0]) if row and row[0] is not None else None
+
+    # EXPLAIN the statement with its real bind parameters; IN lists are expanded to
+    # one placeholder per value. Passing the SQL to the driver as-is keeps text()
+    # from reading ":word" in user input as a bind parameter.
+    compiled = query.statement.compile(dialect=session.get_bind().dialect, compile_kwargs={"render_postcompile": True})
+    params = tuple(compiled.params[name] for name in compiled.positiontup) if compiled.positional else compiled.params
+    plan = session.connection().exec_driver_sql("EXPLAIN " + compiled.string, params).mappings().all()
+    for step in plan:
+        if step["table"] == table:
+            return int(step["rows"] * (step["filtered"] or 100) / 100)
+    return None
+
+
+def get_total_count(session, table, signature, query, mode, filtered=True):
+    """Return (count, is_estimate) for a list query.
+
+    Exact counts are served from count_cache when possible. In "estimate" mode a
+    cache miss uses table statistics or the EXPLAIN row estimate instead of
+    running COUNT(*), falling back to an exact count when no estimate exists.
+    """
+    cached = count_cache.get(table, signature)
+    if cached is not None:
+        return cached, False
+    if mode == "estimate":
+        estimate = _estimate_count(session, table, query, filtered)
+        if estimate is not None:
+            return estimate, True
+    generation = count_cache.generation(table)
+    count = query.count()
+    count_cache.set(table, signature, count, generation)
+    return count, False
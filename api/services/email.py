@@ -1,19 +1,181 @@
+import logging
+import queue
 import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from utils.config import Config
 
-def send_email(recipient, subject, html_body):
+SMTP_POOL_SIZE = 4
+# Idle connections older than this are checked with NOOP before reuse
+SMTP_IDLE_CHECK_SECONDS = 30
+SENDER = "noreply@310bookstoreproject.com"
+
+logger = logging.getLogger(__name__)
+
+
+def build_message(recipient, subject, html_body):
+    msg = MIMEText(html_body, "html")
+    msg["Subject"] = subject
+    msg["From"] = SENDER
+    msg["To"] = recipient
+    return msg
+
+
+class SmtpMailer:
+    """Sends mail over a small pool of authenticated SMTP connections that are reused.
+
+    Each connection pays the connect/STARTTLS/login round trips once instead of once
+    per message. A connection that has dropped is replaced and the message retried
+    once; idle connections are checked with NOOP before reuse. send_many() spreads a
+    batch over the pool's connections in parallel.
+    """
+
+    def __init__(self, pool_size=SMTP_POOL_SIZE):
+        self.pool_size = pool_size
+        # Slots start empty (None) and are connected on first use
+        self._pool = queue.LifoQueue()
+        for _ in range(pool_size):
+            self._pool.put(None)
+        self._lock = threading.Lock()
+        self._executor = None
+        self.messages_sent = 0
+        self.messages_failed = 0
+        self.connections_opened = 0
+        self.reused_sends = 0
+        self._busy_seconds = 0.0
+
+    def _connect(self):
+        server = smtplib.SMTP(Config.SMTP_SERVER, Config.SMTP_PORT, timeout=30)
+        try:
+            # A local SMTP stand-in (e.g. aiosmtpd) runs without TLS or credentials
+            if Config.SMTP_USERNAME:
+                server.starttls()
+                server.login(Config.SMTP_USERNAME, Config.SMTP_PASSWORD)
+        except Exception:
+            _close(server)
+            raise
+        with self._lock:
+            self.connections_opened += 1
+        return server
+
+    def _acquire(self):
+        """Return (connection, reused) from the pool, connecting or health-checking as needed."""
+        slot = self._pool.get()
+        if slot is not None:
+            server, last_used = slot
+            if time.monotonic() - last_used < SMTP_IDLE_CHECK_SECONDS or _is_alive(server):
+                return server, True
+            _close(server)
+        try:
+            return self._connect(), False
+        except Exception:
+            self._pool.put(None)
+            raise
+
+    def _release(self, server):
+        self._pool.put((server, time.monotonic()) if server is not None else None)
+
+    def _deliver(self, msg):
+        server, reused = self._acquire()
+        try:
+            try:
+                server.send_message(msg)
+            except OSError as e:
+                # Every SMTPException is an OSError too, so replies such as a 4xx/5xx
+                # rejection land here; only a dropped connection is worth a retry
+                if isinstance(e, smtplib.SMTPException) and not isinstance(e, smtplib.SMTPServerDisconnected):
+                    raise
+                # The server dropped a pooled connection; retry once on a fresh one
+                _close(server)
+                server = None
+                server, reused = self._connect(), False
+                server.send_message(msg)
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+            # Rejected by the server; the connection itself is still usable
+            self._release(server)
+            raise
+        except Exception:
+            if server is not None:
+                _close(server)
+            self._release(None)
+            raise
+        self._release(server)
+        with self._lock:
+            self.messages_sent += 1
+            if reused:
+                self.reused_sends += 1
+
+    def _send_one(self, message):
+        recipient, subject, html_body = message
+        try:
+            self._deliver(build_message(recipient, subject, html_body))
+            return True
+        except Exception as e:
+            with self._lock:
+                self.messages_failed += 1
+            logger.warning("Failed to send email to %s: %s", recipient, e)
+            return False
+
+    def send(self, recipient, subject, html_body):
+        """Send one HTML email; returns True on success."""
+        return self.send_many([(recipient, subject, html_body)])[0]
+
+    def send_many(self, messages):
+        """Send (recipient, subject, html_body) tuples over the pool's connections.
+        Returns one success flag per message, in order."""
+        messages = list(messages)
+        started = time.monotonic()
+        if len(messages) <= 1:
+            results = [self._send_one(m) for m in messages]
+        else:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="smtp")
+            results = list(self._executor.map(self._send_one, messages))
+        with self._lock:
+            self._busy_seconds += time.monotonic() - started
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {
+                "messages_sent": self.messages_sent,
+                "messages_failed": self.messages_failed,
+                "connections_opened": self.connections_opened,
+                "messages_per_second": self.messages_sent / self._busy_seconds if self._busy_seconds else 0.0,
+                "connection_reuse_ratio": self.reused_sends / self.messages_sent if self.messages_sent else 0.0,
+            }
+
+    def close(self):
+        """Close every pooled connection."""
+        slots = [self._pool.get() for _ in range(self.pool_size)]
+        for slot in slots:
+            if slot is not None:
+                _close(slot[0], quit=True)
+            self._pool.put(None)
+
+
+def _is_alive(server):
     try:
-        msg = MIMEText(html_body, "html")
-        msg["Subject"] = subject
-        msg["From"] = "noreply@310bookstoreproject.com"
-        msg["To"] = recipient
-
-        with smtplib.SMTP(Config.SMTP_SERVER, Config.SMTP_PORT) as server:
-            server.starttls()
-            server.login(Config.SMTP_USERNAME, Config.SMTP_PASSWORD)
-            server.send_message(msg)
-        return True
-    except Exception as e:
-        print(f"Failed to send email to {recipient}: {e}")
+        return server.noop()[0] == 250
+    except Exception:
         return False
+
+
+def _close(server, quit=False):
+    try:
+        if quit:
+            server.quit()
+        else:
+            server.close()
+    except Exception:
+        pass
+
+
+mailer = SmtpMailer()
+
+
+def send_email(recipient, subject, html_body):
+    return mailer.send(recipient, subject, html_body)
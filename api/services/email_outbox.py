@@ -0,0 +1,91 @@
+import logging
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+from api.services.email import mailer
+from api.services.request_logging import configure_logging
+from utils.db import SessionLocal
+from utils.models import EmailOutbox, Order
+
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_POLL_SECONDS = 2
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_BACKOFF_BASE_SECONDS = 30
+OUTBOX_BACKOFF_MAX_SECONDS = 3600
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_email(session, recipient, subject, html_body, order_id=None):
+    """Queue an email in the caller's transaction; it is sent once the caller commits."""
+    message = EmailOutbox(order_id=order_id, recipient=recipient, subject=subject, html_body=html_body, attempts=0, next_attempt_at=datetime.now())
+    session.add(message)
+    return message
+
+
+def retry_delay(attempts):
+    """Seconds to wait before the next try after `attempts` failed sends."""
+    return min(OUTBOX_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), OUTBOX_BACKOFF_MAX_SECONDS)
+
+
+def process_outbox(batch_size=OUTBOX_BATCH_SIZE):
+    """Send one batch of due messages and return how many were attempted.
+
+    Due rows are locked with SKIP LOCKED so several workers can run side by side
+    without sending the same message twice. A sent message marks its order's
+    email_sent; a failed one is rescheduled with exponential backoff until
+    OUTBOX_MAX_ATTEMPTS is reached.
+    """
+    session = SessionLocal()
+    try:
+        now = datetime.now()
+        messages = session.scalars(
+            select(EmailOutbox)
+            .where(EmailOutbox.sent_at.is_(None), EmailOutbox.next_attempt_at <= now, EmailOutbox.attempts < OUTBOX_MAX_ATTEMPTS)
+            .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+
+        results = mailer.send_many((m.recipient, m.subject, m.html_body) for m in messages)
+        sent_order_ids = []
+        for message, sent in zip(messages, results):
+            if sent:
+                message.sent_at = datetime.now()
+                if message.order_id is not None:
+                    sent_order_ids.append(message.order_id)
+            else:
+                message.attempts += 1
+                message.next_attempt_at = datetime.now() + timedelta(seconds=retry_delay(message.attempts))
+                if message.attempts >= OUTBOX_MAX_ATTEMPTS:
+                    logger.error("Giving up on email %s to %s after %s attempts", message.id, message.recipient, message.attempts)
+        if sent_order_ids:
+            session.execute(update(Order).where(Order.id.in_(sent_order_ids)).values(email_sent=True))
+        session.commit()
+        return len(messages)
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def run_worker(poll_interval=OUTBOX_POLL_SECONDS, batch_size=OUTBOX_BATCH_SIZE):
+    """Send queued emails until interrupted, sleeping while the outbox is empty."""
+    logger.info("Email worker started")
+    while True:
+        try:
+            processed = process_outbox(batch_size)
+        except Exception:
+            logger.exception("Email worker error")
+            processed = 0
+        if processed:
+            logger.info("Email worker stats", extra=mailer.stats())
+        if processed < batch_size:
+            time.sleep(poll_interval)
+
+
+if __name__ == "__main__":
+    configure_logging()
+    run_worker()
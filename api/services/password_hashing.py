@@ -0,0 +1,110 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from utils.config import Config
+
+
+class HashingPoolBusy(Exception):
+    """Raised when a password hash cannot be computed right now.
+
+    status is 429 when the pool's queue is full and the request was turned away
+    immediately, and 503 when it was queued but not started within the wait limit.
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class PasswordHasher:
+    """Runs bcrypt on a small dedicated thread pool with a bounded queue.
+
+    bcrypt releases the GIL while hashing, so pool_size threads keep up to pool_size
+    cores busy while request threads only wait on the result. At most max_queue hashes
+    wait behind the running ones; further requests are rejected at once (429) instead
+    of piling up and holding every web worker for the length of the burst. A queued
+    request that has not started within queue_timeout seconds gives up (503).
+    """
+
+    def __init__(self, pool_size=None, max_queue=None, queue_timeout=None, rounds=None):
+        self.pool_size = pool_size or Config.BCRYPT_POOL_SIZE
+        self.max_queue = Config.BCRYPT_MAX_QUEUE if max_queue is None else max_queue
+        self.queue_timeout = queue_timeout or Config.BCRYPT_QUEUE_TIMEOUT
+        self.rounds = rounds or Config.BCRYPT_ROUNDS
+        self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _run(self, func, *args):
+        with self._lock:
+            if self._pending >= self.pool_size + self.max_queue:
+                self.rejected += 1
+                raise HashingPoolBusy(429, "Too many sign-in requests in progress, please retry shortly")
+            self._pending += 1
+        started = threading.Event()
+
+        def task():
+            started.set()
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self._pending -= 1
+                    self.completed += 1
+
+        future = self._executor.submit(task)
+        if not started.wait(self.queue_timeout) and future.cancel():
+            with self._lock:
+                self._pending -= 1
+                self.timed_out += 1
+            raise HashingPoolBusy(503, "Sign-in is temporarily unavailable, please retry shortly")
+        # Once started, a hash always finishes; only the wait for a slot is bounded
+        return future.result()
+
+    def hash(self, password):
+        """Return the bcrypt hash of password at the configured cost, as a str."""
+        return self._run(_hash, password, self.rounds)
+
+    def verify(self, password, password_hash):
+        return self._run(_verify, password, password_hash)
+
+    def needs_rehash(self, password_hash):
+        """True when password_hash was made with a different cost than configured."""
+        return hash_rounds(password_hash) != self.rounds
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pool_size": self.pool_size,
+                "max_queue": self.max_queue,
+                "rounds": self.rounds,
+                "in_flight": self._pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+            }
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=rounds)).decode("utf-8")
+
+
+def _verify(password, password_hash):
+    try:
+        return bcrypt.checkpw(password.encode("utf-8"), password_hash.encode("utf-8"))
+    except ValueError:
+        # Not a bcrypt hash at all
+        return False
+
+
+def hash_rounds(password_hash):
+    """Cost factor of a "$2b$12$..." bcrypt hash, or None if it is not one."""
+    parts = password_hash.split("$")
+    return int(parts[2]) if len(parts) == 4 and parts[2].isdigit() else None
+
+
+password_hasher = PasswordHasher()
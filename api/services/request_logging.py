@@ -0,0 +1,168 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import sys
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from flask import g, has_request_context, request
+from utils.config import Config
+
+ACCESS_LOGGER = "api.access"
+REDACTED = "[REDACTED]"
+# JWTs (three base64url segments starting with a JSON header) and bearer tokens in free text
+_TOKEN_PATTERN = re.compile(r"eyJ[\w-]+\.[\w-]+\.[\w-]*|(?i:bearer)\s+[\w.~+/-]+=*")
+_SECRET_KEYS = ("token", "authorization", "password", "secret")
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName", "request_id"}
+
+_listener = None
+
+
+@lru_cache(maxsize=1024)
+def _is_secret_key(key):
+    key = str(key).lower()
+    return any(s in key for s in _SECRET_KEYS)
+
+
+def redact(value):
+    """Mask tokens in strings and secret-looking keys in dicts, recursively."""
+    if isinstance(value, str):
+        # Cheap substring test first; almost no logged string holds a token
+        return _TOKEN_PATTERN.sub(REDACTED, value) if "eyJ" in value or "earer" in value else value
+    if isinstance(value, dict):
+        return {k: REDACTED if _is_secret_key(k) else redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request id and any
+    `extra=` fields, with tokens redacted."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": redact(record.getMessage()),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = REDACTED if _is_secret_key(key) else redact(value)
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records with the current request id and keep only a sample of requests.
+
+    A request is kept or dropped as a whole (by hashing its id), so the records of a
+    sampled request stay together. Warnings and errors are always kept.
+    """
+
+    def __init__(self, sample_rate=1.0):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        request_id = g.get("request_id") if has_request_context() else None
+        record.request_id = request_id
+        if request_id is None or record.levelno >= logging.WARNING or self.sample_rate >= 1.0:
+            return True
+        return zlib.crc32(request_id.encode()) / 0xFFFFFFFF < self.sample_rate
+
+
+class _InProcessQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler for a queue read in this process: records are passed as they are.
+    The stock prepare() formats and copies every record on the calling thread so it
+    can be pickled, which is exactly the work the listener thread is there to do."""
+
+    def prepare(self, record):
+        return record
+
+
+def _parse_levels(spec):
+    """Parse "api.auth=WARNING,api.routes.books=DEBUG" into {logger: level}."""
+    levels = {}
+    for item in (spec or "").split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(level=None, module_levels=None, sample_rate=None, stream=None):
+    """Route all logging through a queue to a background thread that writes JSON lines.
+
+    Request threads only enqueue records; formatting, redaction and the stdout write
+    happen on the QueueListener thread. Safe to call more than once; later calls
+    replace the previous setup.
+    """
+    global _listener
+    _stop_listener()
+    # The JSON records carry no caller or process fields, so skip collecting them
+    # when each record is created (see "Optimization" in the logging docs)
+    logging._srcfile = None
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+    log_queue = queue.SimpleQueue()
+    queue_handler = _InProcessQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter(Config.LOG_SAMPLE_RATE if sample_rate is None else sample_rate))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level or Config.LOG_LEVEL)
+    for name, module_level in (module_levels if module_levels is not None else _parse_levels(Config.LOG_LEVELS)).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def _stop_listener():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(_stop_listener)
+
+
+def init_app(app):
+    """Configure logging and log one access record per request with its duration."""
+    configure_logging()
+    access_log = logging.getLogger(ACCESS_LOGGER)
+
+    @app.before_request
+    def _start_request():
+        g.request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _log_request(response):
+        duration_ms = (time.perf_counter() - g.request_started) * 1000
+        response.headers["X-Request-ID"] = g.request_id
+        access_log.info("request", extra={
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round(duration_ms, 2),
+        })
+        return response
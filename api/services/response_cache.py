@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+RESPONSE_CACHE_SIZE = 1024
+RESPONSE_CACHE_TTL_SECONDS = 30
+
+
+def book_list_tags(statuses):
+    """Tags for a cached book list filtered to statuses (None or empty for no filter)."""
+    if not statuses:
+        return ["books", "books:status:all"]
+    return ["books"] + [f"books:status:{s}" for s in statuses]
+
+
+def book_status_tags(*statuses):
+    """Tags for cached book lists affected by a change to or from these statuses.
+    Lists without a status filter are tagged "books:status:all"."""
+    return ["books:status:all"] + [f"books:status:{s}" for s in statuses if s]
+
+
+class ResponseCache:
+    """LRU cache of serialized responses with a TTL and tag-based invalidation.
+
+    Each entry is stored with a set of tags; invalidate(tag) drops every entry
+    carrying that tag. Responses computed while an invalidation happened are not
+    stored, so a write never leaves a stale entry behind in this process.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._tag_keys = defaultdict(set)
+        self._generation = 0
+
+    def generation(self):
+        """Capture before computing a response; pass to set()."""
+        with self._lock:
+            return self._generation
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, tags, generation):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._remove(key)
+            self._entries[key] = (value, time.monotonic() + self.ttl, tuple(tags))
+            for tag in tags:
+                self._tag_keys[tag].add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, *tags):
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                for key in self._tag_keys.pop(tag, set()):
+                    self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tag_keys.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tag_keys[tag]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+catalog_cache = ResponseCache()
@@ -0,0 +1,242 @@
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from utils.db import SessionLocal
+from utils.models import RevokedToken
+
+# Sizing of the Bloom filter; it is rebuilt larger if more tokens are revoked
+REVOCATION_BLOOM_CAPACITY = 1_000_000
+REVOCATION_BLOOM_ERROR_RATE = 0.001
+# How often a worker picks up tokens revoked by other workers
+REVOCATION_REFRESH_SECONDS = 2
+# Rows below the last id seen that are read again on each refresh, in case a row
+# with a lower id was committed after a higher one
+REVOCATION_REFRESH_OVERLAP = 100
+# How often the in-memory state is rebuilt without expired tokens
+REVOCATION_REBUILD_SECONDS = 600
+
+logger = logging.getLogger(__name__)
+
+
+def _key(jti):
+    """16-byte digest of a jti, used both as the exact-set entry and for the Bloom
+    filter's bit positions."""
+    return hashlib.blake2b(jti.encode("utf-8"), digest_size=16).digest()
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over 16-byte keys.
+
+    The k bit positions come from the two 64-bit halves of the key (double hashing),
+    so adding or checking a key costs no further hashing.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _start(self, key):
+        size = self.size
+        return int.from_bytes(key[:8], "little") % size, (int.from_bytes(key[8:], "little") | 1) % size
+
+    def add(self, key):
+        bits, size = self.bits, self.size
+        position, step = self._start(key)
+        for _ in range(self.hash_count):
+            bits[position >> 3] |= 1 << (position & 7)
+            position = (position + step) % size
+        self.count += 1
+
+    def __contains__(self, key):
+        # About half the bits are set at capacity, so a key that was never added is
+        # usually ruled out by the first one or two positions
+        bits, size = self.bits, self.size
+        position, step = self._start(key)
+        for _ in range(self.hash_count):
+            if not bits[position >> 3] >> (position & 7) & 1:
+                return False
+            position = (position + step) % size
+        return True
+
+
+class RevocationList:
+    """Per-worker view of the revoked_tokens table for token_required.
+
+    A check is a Bloom filter probe, and only keys the filter reports as possibly
+    revoked are confirmed against an exact set, so a false positive never rejects a
+    valid token. The first check in a process loads the table and waits for it, so
+    no token is checked against an empty list; then a background thread picks up
+    rows revoked by other workers (rows with an id above the last one seen) every
+    refresh_seconds. A Bloom filter cannot forget, so every rebuild_seconds that
+    thread also rebuilds both structures from the rows whose tokens have not
+    expired yet. Checks never wait for either.
+    """
+
+    def __init__(self, capacity=REVOCATION_BLOOM_CAPACITY, error_rate=REVOCATION_BLOOM_ERROR_RATE,
+                 refresh_seconds=REVOCATION_REFRESH_SECONDS, rebuild_seconds=REVOCATION_REBUILD_SECONDS):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_seconds = refresh_seconds
+        self.rebuild_seconds = rebuild_seconds
+        # Guards _state changes; held only briefly, never across a query
+        self._lock = threading.Lock()
+        # Serializes the initial load and the refreshes
+        self._refresh_lock = threading.Lock()
+        # (Bloom filter, exact set), replaced as a pair on rebuild
+        self._state = (BloomFilter(capacity, error_rate), set())
+        # Keys revoked by this worker while a rebuild is reading the table, which
+        # the rebuilt state may have missed; None when no rebuild is running
+        self._revoked_during_rebuild = None
+        self._loaded = False
+        self._last_id = 0
+        self._next_rebuild = 0.0
+        self._poller_pid = None
+        self.bloom_hits = 0
+        self.false_positives = 0
+
+    @staticmethod
+    def _add(state, key):
+        bloom, revoked = state
+        if key not in revoked:
+            revoked.add(key)
+            bloom.add(key)
+
+    def start(self):
+        """Load the table if this process has not yet, and start its refresh thread.
+
+        Blocks until the first load is done; a database error is raised and the next
+        call tries again.
+        """
+        with self._refresh_lock:
+            if self._poller_pid == os.getpid():
+                return
+            if not self._loaded:
+                self._rebuild()
+                self._next_rebuild = time.monotonic() + self.rebuild_seconds
+                self._loaded = True
+            # Started per process, so that each forked worker gets its own
+            self._poller_pid = os.getpid()
+            threading.Thread(target=self._poll, name="revocation-refresh", daemon=True).start()
+
+    def is_revoked(self, jti):
+        if not jti:
+            return False
+        if self._poller_pid != os.getpid():
+            self.start()
+        key = _key(jti)
+        bloom, revoked = self._state
+        if key not in bloom:
+            return False
+        self.bloom_hits += 1
+        if key in revoked:
+            return True
+        self.false_positives += 1
+        return False
+
+    def _poll(self):
+        while True:
+            time.sleep(self.refresh_seconds)
+            try:
+                self.refresh()
+            except Exception:
+                # The current state is kept and the refresh retried next time
+                logger.exception("Could not refresh the token revocation list")
+
+    def refresh(self, force_rebuild=False):
+        """Load rows added since the last refresh, or rebuild when one is due."""
+        with self._refresh_lock:
+            if force_rebuild or time.monotonic() >= self._next_rebuild:
+                self._rebuild()
+                self._next_rebuild = time.monotonic() + self.rebuild_seconds
+                return
+            session = SessionLocal()
+            try:
+                rows = session.execute(
+                    select(RevokedToken.id, RevokedToken.jti)
+                    .where(RevokedToken.id > self._last_id - REVOCATION_REFRESH_OVERLAP)
+                    .order_by(RevokedToken.id)
+                ).all()
+            finally:
+                session.close()
+            keys = [_key(jti) for _, jti in rows]
+            with self._lock:
+                for key in keys:
+                    self._add(self._state, key)
+            if rows:
+                self._last_id = max(self._last_id, rows[-1].id)
+
+    def _rebuild(self):
+        with self._lock:
+            self._revoked_during_rebuild = []
+        session = SessionLocal()
+        try:
+            rows = session.execute(select(RevokedToken.id, RevokedToken.jti).where(RevokedToken.expires_at > datetime.now())).all()
+            # Build aside and swap in at once; checks keep using the old state meanwhile
+            # Leave room for the tokens revoked until the next rebuild
+            state = (BloomFilter(max(self.capacity, len(rows) + len(rows) // 4), self.error_rate), set())
+            for _, jti in rows:
+                self._add(state, _key(jti))
+            with self._lock:
+                for key in self._revoked_during_rebuild:
+                    self._add(state, key)
+                self._state = state
+                self._revoked_during_rebuild = None
+            self._last_id = max([self._last_id] + [row_id for row_id, _ in rows])
+            # Rows of expired tokens are not needed any more
+            session.execute(delete(RevokedToken).where(RevokedToken.expires_at <= datetime.now()))
+            session.commit()
+        except Exception:
+            session.rollback()
+            with self._lock:
+                self._revoked_during_rebuild = None
+            raise
+        finally:
+            session.close()
+
+    def revoke(self, jti, expires_at):
+        """Record jti as revoked until expires_at (the token's own expiry).
+
+        The row is committed before this worker's view is updated, so the other
+        workers see it within refresh_seconds.
+        """
+        session = SessionLocal()
+        try:
+            session.add(RevokedToken(jti=jti, expires_at=expires_at))
+            session.commit()
+        except IntegrityError:
+            # Already revoked
+            session.rollback()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        key = _key(jti)
+        with self._lock:
+            self._add(self._state, key)
+            if self._revoked_during_rebuild is not None:
+                self._revoked_during_rebuild.append(key)
+
+    def stats(self):
+        bloom, revoked = self._state
+        return {
+            "revoked": len(revoked),
+            "bloom_bits": bloom.size,
+            "bloom_hash_count": bloom.hash_count,
+            "bloom_capacity": bloom.capacity,
+            "bloom_hits": self.bloom_hits,
+            "false_positives": self.false_positives,
+        }
+
+
+revocation_list = RevocationList()
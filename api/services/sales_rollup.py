@@ -0,0 +1,147 @@
+import argparse
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects import mysql, sqlite
+from api.services.request_logging import configure_logging
+from utils.db import SessionLocal
+from utils.models import Book, BookKeyword, Order, OrderLine, SalesDaily, SalesDailyAuthor, SalesDailyKeyword
+
+REBUILD_CHUNK_SIZE = 5000
+
+logger = logging.getLogger(__name__)
+
+
+def _order_lines(session, order_ids):
+    """Load the sales-relevant facts of every line of the given orders, and the keyword
+    ids of their books."""
+    lines = session.execute(
+        select(Order.order_date, Order.payment_status, OrderLine.type, OrderLine.price, OrderLine.book_id, Book.author_id)
+        .join(OrderLine, OrderLine.order_id == Order.id)
+        .join(Book, Book.id == OrderLine.book_id)
+        .where(Order.id.in_(order_ids))
+    ).all()
+    book_keywords = defaultdict(list)
+    book_ids = {line.book_id for line in lines}
+    if book_ids:
+        for book_id, keyword_id in session.execute(select(BookKeyword.book_id, BookKeyword.keyword_id).where(BookKeyword.book_id.in_(book_ids))):
+            book_keywords[book_id].append(keyword_id)
+    return lines, book_keywords
+
+
+def _accumulate(deltas, lines, book_keywords, sign, status=None):
+    """Add sign * each line to the per-table deltas, under status if given (else the
+    order's current payment status)."""
+    for line in lines:
+        day = line.order_date.date()
+        line_status = status or line.payment_status
+        keys = [(SalesDaily, (day, line_status, line.type)), (SalesDailyAuthor, (day, line.author_id, line_status, line.type))]
+        keys += [(SalesDailyKeyword, (day, keyword_id, line_status, line.type)) for keyword_id in book_keywords.get(line.book_id, ())]
+        for model, key in keys:
+            delta = deltas[model][key]
+            delta[0] += sign
+            delta[1] += sign * Decimal(line.price)
+
+
+def _key_columns(model):
+    return [c.name for c in model.__table__.primary_key.columns]
+
+
+def _upsert(session, model, deltas):
+    """Add the deltas onto the rollup rows in one statement, creating missing rows.
+    Rows are written in key order so concurrent writers lock them in the same order."""
+    if not deltas:
+        return
+    keys = _key_columns(model)
+    rows = [dict(zip(keys, key), line_count=count, revenue=revenue) for key, (count, revenue) in sorted(deltas.items())]
+    table = model.__table__
+    if session.get_bind().dialect.name == "mysql":
+        stmt = mysql.insert(table).values(rows)
+        stmt = stmt.on_duplicate_key_update(line_count=table.c.line_count + stmt.inserted.line_count, revenue=table.c.revenue + stmt.inserted.revenue)
+    else:
+        stmt = sqlite.insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(index_elements=keys, set_={"line_count": table.c.line_count + stmt.excluded.line_count, "revenue": table.c.revenue + stmt.excluded.revenue})
+    session.execute(stmt)
+
+
+def _apply(session, deltas):
+    for model in (SalesDaily, SalesDailyAuthor, SalesDailyKeyword):
+        _upsert(session, model, deltas.get(model))
+
+
+def _new_deltas():
+    return defaultdict(lambda: defaultdict(lambda: [0, Decimal("0")]))
+
+
+def add_orders(session, order_ids):
+    """Count the lines of newly created orders into the rollups, in the caller's transaction.
+    Call after the order lines are flushed."""
+    if not order_ids:
+        return
+    lines, book_keywords = _order_lines(session, order_ids)
+    deltas = _new_deltas()
+    _accumulate(deltas, lines, book_keywords, 1)
+    _apply(session, deltas)
+
+
+def move_orders(session, order_ids, new_status):
+    """Move the lines of orders from their current payment status to new_status in the
+    rollups, in the caller's transaction. Call before the orders themselves are updated.
+
+    Keyword rollups use the books' current keywords, so a book whose keywords were
+    edited after the sale moves under its new keywords; rebuild() realigns them.
+    """
+    if not order_ids:
+        return
+    lines, book_keywords = _order_lines(session, order_ids)
+    lines = [line for line in lines if line.payment_status != new_status]
+    deltas = _new_deltas()
+    _accumulate(deltas, lines, book_keywords, -1)
+    _accumulate(deltas, lines, book_keywords, 1, status=new_status)
+    _apply(session, deltas)
+
+
+def rebuild(chunk_size=REBUILD_CHUNK_SIZE):
+    """Recompute every rollup from the full order history, committing one chunk of
+    orders at a time. Orders created while it runs are counted by create_order, but
+    order status updates should be paused until it finishes."""
+    session = SessionLocal()
+    try:
+        # Read the max id before clearing, in the same transaction: an order counted
+        # by create_order between the clear and the read would be counted again
+        # below. Locking the read also holds off new orders until the clear commits,
+        # so none of them is wiped from the rollups after the max id was taken.
+        max_order_id = session.scalar(select(func.max(Order.id)).with_for_update())
+        for model in (SalesDaily, SalesDailyAuthor, SalesDailyKeyword):
+            session.execute(delete(model))
+        session.commit()
+        # Orders above max_order_id are counted by create_order itself
+        logger.info("Rebuilding sales rollups", extra={"max_order_id": max_order_id})
+
+        last_id = 0
+        while max_order_id is not None:
+            order_ids = session.scalars(
+                select(Order.id).where(Order.id > last_id, Order.id <= max_order_id).order_by(Order.id).limit(chunk_size)
+            ).all()
+            if not order_ids:
+                break
+            add_orders(session, order_ids)
+            session.commit()
+            last_id = order_ids[-1]
+            logger.info("Rolled up orders", extra={"last_order_id": last_id})
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the daily sales rollup tables.")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--chunk-size", type=int, default=REBUILD_CHUNK_SIZE)
+    args = parser.parse_args()
+    configure_logging()
+    rebuild(args.chunk_size)
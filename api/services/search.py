@@ -0,0 +1,97 @@
+import threading
+from collections import defaultdict
+
+from sqlalchemy import text
+from sqlalchemy.dialects.mysql import match
+from utils.models import Book
+
+# ngram_token_size defaults to 2 on MySQL, shorter search terms never match the FULLTEXT index
+MIN_FULLTEXT_TERM = 2
+
+_fulltext_available = None
+
+
+def _has_fulltext_index(session):
+    """Check once per process whether books.title has a FULLTEXT index (see migrations/03)."""
+    global _fulltext_available
+    if _fulltext_available is None:
+        row = session.execute(text(
+            "SELECT 1 FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = 'books' "
+            "AND column_name = 'title' AND index_type = 'FULLTEXT' LIMIT 1"
+        )).first()
+        _fulltext_available = row is not None
+    return _fulltext_available
+
+
+def _trigrams(value):
+    value = value.lower()
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+class TrigramIndex:
+    """In-process trigram index over book titles.
+
+    Stand-in for the MySQL FULLTEXT index when running against SQLite or another
+    database without one. The index is loaded from the books table on first use and
+    kept current through add().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._titles = {}
+        self._postings = defaultdict(set)
+
+    def _load(self, session):
+        for book_id, title in session.query(Book.id, Book.title).yield_per(10000):
+            self._add(book_id, title)
+        self._loaded = True
+
+    def _add(self, book_id, title):
+        old_title = self._titles.get(book_id)
+        if old_title is not None:
+            for gram in _trigrams(old_title):
+                self._postings[gram].discard(book_id)
+        self._titles[book_id] = title.lower()
+        for gram in _trigrams(title):
+            self._postings[gram].add(book_id)
+
+    def add(self, book_id, title):
+        """Index a new or retitled book. No-op until the index has been loaded."""
+        with self._lock:
+            if self._loaded and title is not None:
+                self._add(book_id, title)
+
+    def search(self, session, term):
+        """Return the ids of all books whose title contains term (case-insensitive)."""
+        term = term.lower()
+        with self._lock:
+            if not self._loaded:
+                self._load(session)
+            grams = _trigrams(term)
+            if grams:
+                # Intersect the smallest posting lists first
+                postings = sorted((self._postings.get(g, set()) for g in grams), key=len)
+                candidates = set(postings[0]).intersection(*postings[1:])
+            else:
+                candidates = self._titles.keys()
+            return [book_id for book_id in candidates if term in self._titles[book_id]]
+
+
+title_index = TrigramIndex()
+
+
+def title_contains_filter(session, term):
+    """Build the filter for a title substring search.
+
+    Uses MATCH ... AGAINST on MySQL when the FULLTEXT index exists, the in-process
+    trigram index on other databases, and falls back to ILIKE otherwise.
+    """
+    if session.get_bind().dialect.name == "mysql":
+        phrase = term.replace('"', " ").strip()
+        if len(phrase) >= MIN_FULLTEXT_TERM and _has_fulltext_index(session):
+            # A quoted phrase over an ngram index matches the contiguous substring
+            return match(Book.title, against=f'"{phrase}"').in_boolean_mode()
+        return Book.title.ilike(f"%{term}%")
+    return Book.id.in_(title_index.search(session, term))
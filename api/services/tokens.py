@@ -0,0 +1,86 @@
+import hashlib
+import secrets
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import jwt
+from sqlalchemy import delete, update
+from utils.config import Config
+from utils.models import RefreshToken
+
+ACCESS_TOKEN_MINUTES = 30
+
+
+class InvalidRefreshToken(Exception):
+    pass
+
+
+def create_access_token(user_id, role):
+    # jti identifies the token for revocation on logout
+    return jwt.encode({"id": user_id, "role": role, "jti": uuid.uuid4().hex, "exp": datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_MINUTES)}, Config.JWT_SECRET_KEY, algorithm="HS256")
+
+
+def _hash_token(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def issue_refresh_token(session, user_id, family_id=None):
+    """Add a new refresh token for user_id to the session and return it.
+
+    Without family_id a new family is started (a fresh login). Only the token's hash
+    is stored; the caller commits.
+    """
+    token = secrets.token_urlsafe(32)
+    session.add(RefreshToken(
+        user_id=user_id,
+        token_hash=_hash_token(token),
+        family_id=family_id or secrets.token_hex(16),
+        expires_at=datetime.now() + timedelta(days=Config.REFRESH_TOKEN_DAYS),
+    ))
+    return token
+
+
+def rotate_refresh_token(session, token):
+    """Revoke token and return (user_id, next refresh token in the same family).
+
+    The revoke is a conditional UPDATE, so of two requests presenting the same token
+    only one wins. A token that was already revoked has been used before, which means
+    it leaked or was replayed: its whole family is revoked, logging that session out.
+    Raises InvalidRefreshToken; the caller commits in both cases.
+    """
+    row = session.query(RefreshToken).filter_by(token_hash=_hash_token(token or "")).first()
+    if row is None:
+        raise InvalidRefreshToken("Refresh token is invalid")
+    now = datetime.now()
+    if row.expires_at <= now:
+        raise InvalidRefreshToken("Refresh token has expired")
+    revoked = session.execute(
+        update(RefreshToken)
+        .where(RefreshToken.id == row.id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=now)
+    ).rowcount
+    if not revoked:
+        revoke_family(session, row.family_id)
+        raise InvalidRefreshToken("Refresh token was already used")
+    return row.user_id, issue_refresh_token(session, row.user_id, row.family_id)
+
+
+def revoke_family(session, family_id):
+    session.execute(
+        update(RefreshToken)
+        .where(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.now())
+    )
+
+
+def revoke_refresh_token(session, token):
+    """Revoke the family of token (logout). Unknown tokens are ignored."""
+    row = session.query(RefreshToken.family_id).filter_by(token_hash=_hash_token(token)).first()
+    if row is not None:
+        revoke_family(session, row.family_id)
+
+
+def purge_expired_refresh_tokens(session, user_id):
+    """Delete user_id's expired refresh tokens. Revoked ones are kept until they
+    expire so that replaying them is still recognised."""
+    session.execute(delete(RefreshToken).where(RefreshToken.user_id == user_id, RefreshToken.expires_at <= datetime.now()))
@@ -0,0 +1,78 @@
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from utils.models import User
+
+USER_CACHE_SIZE = 10000
+USER_CACHE_TTL_SECONDS = 30
+
+
+class UserCache:
+    """Bounded LRU cache of user id -> role for the per-request check in token_required.
+
+    Only users that exist are cached, for at most ttl seconds. Entries are dropped
+    explicitly through invalidate() when a user is updated or deleted; the mapper
+    events below do that for changes made through the ORM. Bulk UPDATE/DELETE
+    statements on users bypass those events and must call invalidate() themselves.
+    """
+
+    def __init__(self, max_entries=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, user_id):
+        """Return the cached role of user_id, or None when the database must be asked."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] < time.monotonic():
+                del self._entries[user_id]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, user_id, role):
+        with self._lock:
+            self._entries[user_id] = (role, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                # Every hit is a user query token_required did not have to run
+                "db_lookups_saved": self.hits,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+user_cache = UserCache()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user(mapper, connection, target):
+    user_cache.invalidate(target.id)
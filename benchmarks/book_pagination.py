@@ -0,0 +1,88 @@
+"""Page 1 vs deep-page latency of GET /api/v1/books/ in offset and cursor mode.
+
+Runs the API in-process against a temporary SQLite database seeded with enough
+books to reach the requested page:
+
+    python -m benchmarks.book_pagination --page 3000 --page-size 100
+
+SQLite, like MySQL, has to walk and discard every row before an OFFSET, so the
+offset numbers grow with the page while cursor mode seeks straight to its id.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+# The API reads its configuration at import, so point it at a SQLite file first
+_db_dir = tempfile.mkdtemp(prefix="bookstore-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_db_dir, 'bench.db')}")
+os.environ.setdefault("DB_PASSWORD", "bench")
+os.environ.setdefault("JWT_SECRET", "bench-secret-key-with-at-least-32-bytes")
+os.environ.setdefault("SMTP_SERVER", "localhost")
+os.environ.setdefault("SMTP_PORT", "2525")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from api.app import app
+from api.services.response_cache import catalog_cache
+from api.services.tokens import create_access_token
+from utils.db import engine
+from utils.models import Author, Base, Book, User
+
+BOOK_STATUSES = ("new", "returned", "rented", "sold")
+SEED_BATCH = 50000
+
+
+def seed(book_count):
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{"id": 1, "email": "manager@example.com", "username": "manager", "password_hash": "x", "role": "manager"}])
+        conn.execute(Author.__table__.insert(), [{"id": a, "name": f"Author {a}", "bio": "bio"} for a in range(1, 101)])
+        for start in range(1, book_count + 1, SEED_BATCH):
+            conn.execute(Book.__table__.insert(), [
+                {"id": b, "author_id": b % 100 + 1, "title": f"Book {b}", "description": "description", "price_buy": 10, "price_rent": 2, "status": BOOK_STATUSES[b % 4]}
+                for b in range(start, min(start + SEED_BATCH, book_count + 1))
+            ])
+
+
+def measure(client, headers, url, repeat):
+    timings = []
+    for _ in range(repeat):
+        # Time the database work, not the response cache
+        catalog_cache.invalidate("books")
+        started = time.perf_counter()
+        response = client.get(url, headers=headers)
+        timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, response.get_json()
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--page", type=int, default=3000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    book_count = args.page * args.page_size
+    print(f"Seeding {book_count} books...")
+    seed(book_count)
+    client = app.test_client()
+    headers = {"Authorization": create_access_token(1, "manager")}
+    # The first request loads the token revocation list
+    client.get("/api/v1/books/?page_size=1", headers=headers)
+
+    # Ids are dense, so the last id before a page is (page - 1) * page_size
+    deep_after_id = (args.page - 1) * args.page_size
+    cases = [
+        ("offset", 1, f"/api/v1/books/?page_size={args.page_size}&page_number=1"),
+        ("offset", args.page, f"/api/v1/books/?page_size={args.page_size}&page_number={args.page}"),
+        ("cursor", 1, f"/api/v1/books/?page_size={args.page_size}&cursor="),
+        ("cursor", args.page, f"/api/v1/books/?page_size={args.page_size}&after_id={deep_after_id}"),
+    ]
+    for mode, page, url in cases:
+        print(f"{mode:<7} page {page:>5}: {measure(client, headers, url, args.repeat):8.2f} ms (median of {args.repeat})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,87 @@
+import threading
+from collections import OrderedDict
+
 import requests
 from utils.config import decode_token
 
+# Number of GET responses kept for ETag revalidation
+VALIDATOR_CACHE_SIZE = 256
+
 class ApiClient:
     def __init__(self, base_url: str):
         self.base_url = base_url
+        self._validators = OrderedDict()
+        self._validators_lock = threading.Lock()
+        # Access/refresh tokens of the logged-in session, renewed by _refresh()
+        self._auth_lock = threading.Lock()
+        self._access_token = None
+        self._refresh_token = None
+        self._session_tokens = set()
+
+    def _current_token(self, jwt):
+        """The latest access token of the session jwt belongs to, or jwt itself."""
+        with self._auth_lock:
+            return self._access_token if jwt in self._session_tokens else jwt
+
+    def _refresh(self, stale_token):
+        """Swap the refresh token for a new access token; returns it, or None if the
+        session can't be renewed. Concurrent callers share a single refresh."""
+        with self._auth_lock:
+            if stale_token not in self._session_tokens or not self._refresh_token:
+                return None
+            if self._access_token != stale_token:
+                # Another thread refreshed while this one waited
+                return self._access_token
+            response = requests.post(f"{self.base_url}/users/refresh", json={"refresh_token": self._refresh_token})
+            if response.status_code != 200:
+                self._refresh_token = None
+                return None
+            data = response.json()
+            self._access_token = data["token"]
+            self._refresh_token = data["refresh_token"]
+            self._session_tokens.add(self._access_token)
+            return self._access_token
+
+    def _send(self, method: str, url: str, headers: dict, **kwargs):
+        """Send an authorized request, renewing an expired access token once.
+
+        Callers keep passing the token they got from login(); after a refresh the
+        renewed token is sent in its place.
+        """
+        token = self._current_token(headers.get("Authorization"))
+        response = requests.request(method, url, headers={**headers, "Authorization": token}, **kwargs)
+        if response.status_code == 401 and _is_expired(response):
+            renewed = self._refresh(token)
+            if renewed:
+                response = requests.request(method, url, headers={**headers, "Authorization": renewed}, **kwargs)
+        return response
+
+    def _conditional_get(self, url: str, headers: dict, params=None):
+        """GET url, revalidating a previously seen response with If-None-Match.
+
+        Returns (status_code, json). A 304 from the server is answered from the
+        stored copy and reported as 200.
+        """
+        key = requests.Request("GET", url, params=params).prepare().url
+        with self._validators_lock:
+            cached = self._validators.get(key)
+        if cached:
+            headers = {**headers, "If-None-Match": cached[0]}
+        response = self._send("GET", url, headers, params=params)
+        if response.status_code == 304 and cached:
+            with self._validators_lock:
+                if key in self._validators:
+                    self._validators.move_to_end(key)
+            return 200, cached[1]
+        data = response.json()
+        etag = response.headers.get("ETag")
+        if response.status_code == 200 and etag:
+            with self._validators_lock:
+                self._validators[key] = (etag, data)
+                self._validators.move_to_end(key)
+                while len(self._validators) > VALIDATOR_CACHE_SIZE:
+                    self._validators.popitem(last=False)
+        return response.status_code, data
 
 
     # SIGN IN / REGISTERATION
@@ -12,13 +90,33 @@ class ApiClient:
         if (response.status_code != 200):
             raise Exception("Login failed: " + response.json().get("error", "Unknown error"))
         token = response.json().get("token")
+        refresh_token = response.json().get("refresh_token")
+        with self._auth_lock:
+            self._access_token = token
+            self._refresh_token = refresh_token
+            self._session_tokens = {token}
         user_id = decode_token(token).get("id")
         role = decode_token(token).get("role")
         return {
             "token": token,
+            "refresh_token": refresh_token,
             "user_id": user_id,
             "role": role
         }
+
+    def logout(self):
+        """End the session on the server (revokes both tokens) and forget its tokens."""
+        with self._auth_lock:
+            access_token = self._access_token
+            refresh_token = self._refresh_token
+            self._access_token = None
+            self._refresh_token = None
+            self._session_tokens = set()
+        if access_token or refresh_token:
+            try:
+                requests.post(f"{self.base_url}/users/logout", headers={"Authorization": access_token or ""}, json={"refresh_token": refresh_token})
+            except requests.RequestException:
+                pass
     
     def register(self, username: str, password: str, email: str, first_name: str, last_name: str, role: str) -> dict:
         response = requests.post(f"{self.base_url}/users/register", json={
@@ -44,21 +142,21 @@ class ApiClient:
         }
         if role is not None:
             params["role"] = role
-        response = requests.get(f"{self.base_url}/users/", headers=headers, params=params)
+        response = self._send("GET", f"{self.base_url}/users/", headers=headers, params=params)
         if response.status_code != 200:
             raise Exception("Failed to fetch users: " + response.json().get("error", "Unknown error"))
         return response.json()
     
     def get_user_details(self, jwt: str, user_id: int):
         headers = {"Authorization": f"{jwt}"}
-        response = requests.get(f"{self.base_url}/users/{user_id}", headers=headers)
+        response = self._send("GET", f"{self.base_url}/users/{user_id}", headers=headers)
         if response.status_code != 200:
             raise Exception("Failed to fetch user details: " + response.json().get("error", "Unknown error"))
         return response.json()
     
 
     # BOOKS
-    def get_books(self, jwt: str, author_id=None, author_name=None, status=None, keyword=None, title_contains=None, include_total=False, page_number=1, page_size=100):
+    def get_books(self, jwt: str, author_id=None, author_name=None, status=None, keyword=None, title_contains=None, include_total=False, page_number=1, page_size=100, cursor=None, keyword_any=None, keyword_not=None):
         headers = {"Authorization": f"{jwt}"}
         params = {}
         if author_id is not None:
@@ -69,79 +167,112 @@ class ApiClient:
             params["status"] = status
         if keyword is not None:
             params["keyword"] = keyword 
+        if keyword_any is not None:
+            params["keyword_any"] = keyword_any
+        if keyword_not is not None:
+            params["keyword_not"] = keyword_not
         if title_contains is not None:
             params["title_contains"] = title_contains
         params["include_total"] = str(include_total).lower()
-        params["page_number"] = page_number
+        # Pass cursor="" for the first keyset page, then the returned page["next_cursor"]
+        if cursor is not None:
+            params["cursor"] = cursor
+        else:
+            params["page_number"] = page_number
         params["page_size"] = page_size
-        response = requests.get(f"{self.base_url}/books/", headers=headers, params=params)
-        if response.status_code != 200:
-            raise Exception("Failed to fetch books: " + response.json().get("error", "Unknown error"))
-        return response.json()
+        status_code, data = self._conditional_get(f"{self.base_url}/books/", headers=headers, params=params)
+        if status_code != 200:
+            raise Exception("Failed to fetch books: " + data.get("error", "Unknown error"))
+        return data
     
     def get_book_details(self, jwt: str, book_id: int):
         headers = {"Authorization": f"{jwt}"}
-        response = requests.get(f"{self.base_url}/books/{book_id}", headers=headers)
+        status_code, data = self._conditional_get(f"{self.base_url}/books/{book_id}", headers=headers)
+        if status_code != 200:
+            raise Exception("Failed to fetch book details: " + data.get("error", "Unknown error"))
+        return data
+    
+    def get_books_by_ids(self, jwt: str, book_ids: list):
+        headers = {"Authorization": f"{jwt}"}
+        params = {"ids": ",".join(str(i) for i in book_ids)}
+        response = self._send("GET", f"{self.base_url}/books/batch", headers=headers, params=params)
         if response.status_code != 200:
             raise Exception("Failed to fetch book details: " + response.json().get("error", "Unknown error"))
         return response.json()
     
     def get_user_rented_books(self, jwt: str):
         headers = {"Authorization": f"{jwt}"}
-        response = requests.get(f"{self.base_url}/books/rented", headers=headers)
+        response = self._send("GET", f"{self.base_url}/books/rented", headers=headers)
         if response.status_code != 200:
             raise Exception("Failed to fetch rented books: " + response.json().get("error", "Unknown error"))
         return response.json()
     
     def return_book(self, jwt: str, book_id: int):
         headers = {"Authorization": f"{jwt}"}
-        response = requests.patch(f"{self.base_url}/books/{book_id}/return", headers=headers)
+        response = self._send("PATCH", f"{self.base_url}/books/{book_id}/return", headers=headers)
         if response.status_code != 200:
             raise Exception("Failed to return book: " + response.json().get("error", "Unknown error"))
         return response.json()
     
     def create_book(self, jwt: str, data):
         headers = {"Authorization": f"{jwt}"}
-        response = requests.post(f"{self.base_url}/books/create_book", json=data, headers=headers)
+        response = self._send("POST", f"{self.base_url}/books/create_book", json=data, headers=headers)
         if response.status_code != 200 and response.status_code != 201:
             raise Exception("Failed to add book: " + response.json().get("error", "Unknown error"))
         return response.json()
     
     def update_book(self, jwt: str, book_id: int, data):
         headers = {"Authorization": f"{jwt}"}
-        response = requests.put(f"{self.base_url}/books/{book_id}/update", json=data, headers=headers)
+        response = self._send("PUT", f"{self.base_url}/books/{book_id}/update", json=data, headers=headers)
         if response.status_code != 200:
             raise Exception("Failed to update book: " + response.json().get("error", "Unknown error"))
         return response.json()
     
 
+    def update_books_status(self, jwt: str, new_status: str, book_ids=None, filters=None):
+        headers = {"Authorization": f"{jwt}"}
+        data = {"status": new_status}
+        if book_ids is not None:
+            data["ids"] = list(book_ids)
+        if filters is not None:
+            data["filter"] = filters
+        response = self._send("PATCH", f"{self.base_url}/books/status", json=data, headers=headers)
+        if response.status_code != 200:
+            raise Exception("Failed to update book statuses: " + response.json().get("error", "Unknown error"))
+        return response.json()
+    
+
     # ORDERS
-    def get_orders(self, jwt: str, status=None, include_total=True, page_number=1, page_size=100):
+    def get_orders(self, jwt: str, status=None, include_total=True, page_number=1, page_size=100, cursor=None):
         headers = {"Authorization": f"{jwt}"}
         params = {}
         if status is not None:
             params["status"] = status
         params["include_total"] = str(include_total).lower()
-        params["page_number"] = page_number
         params["page_size"] = page_size
-        response = requests.get(f"{self.base_url}/orders/", headers=headers, params=params)
-        if response.status_code != 200:
-            raise Exception("Failed to fetch orders: " + response.json().get("error", "Unknown error"))
-        return response.json()
+        # Pass cursor="" for the first keyset page, then the returned page["next_cursor"]
+        if cursor is not None:
+            params["cursor"] = cursor
+        else:
+            params["page_number"] = page_number
+        status_code, data = self._conditional_get(f"{self.base_url}/orders/", headers=headers, params=params)
+        if status_code != 200:
+            raise Exception("Failed to fetch orders: " + data.get("error", "Unknown error"))
+        return data
     
     def get_order_details(self, jwt: str, order_id: int):
         headers = {"Authorization": f"{jwt}"}
-        response = requests.get(f"{self.base_url}/orders/{order_id}", headers=headers)
-        if response.status_code != 200:
-            raise Exception("Failed to fetch order details: " + response.json().get("error", "Unknown error"))
-        return response.json()
+        status_code, data = self._conditional_get(f"{self.base_url}/orders/{order_id}", headers=headers)
+        if status_code != 200:
+            raise Exception("Failed to fetch order details: " + data.get("error", "Unknown error"))
+        return data
     
     def create_order(self, jwt: str, orderlines: list):
         headers = {"Authorization": f"{jwt}"}
         data = {
             "order_lines": orderlines
         }
-        response = requests.post(f"{self.base_url}/orders/create_order", json=data, headers=headers)
+        response = self._send("POST", f"{self.base_url}/orders/create_order", json=data, headers=headers)
         if response.status_code != 200 and response.status_code != 201:
             try:
                 raise Exception("Failed to create order: " + response.json().get("error", "Unknown error"))
@@ -150,15 +281,56 @@ class ApiClient:
             
         return response.json()
     
+    def get_order_bill(self, jwt: str, order_id: int):
+        # Returns the bill HTML; requests decompresses the gzip-encoded body
+        headers = {"Authorization": f"{jwt}"}
+        response = self._send("GET", f"{self.base_url}/orders/{order_id}/bill", headers=headers)
+        if response.status_code != 200:
+            raise Exception("Failed to fetch bill: " + response.json().get("error", "Unknown error"))
+        return response.text
+
     def update_order_status(self, jwt: str, order_id: int, new_status: str):
         headers = {"Authorization": f"{jwt}"}
         data = {"status": new_status}
-        response = requests.patch(f"{self.base_url}/orders/{order_id}/status", json=data, headers=headers)
+        response = self._send("PATCH", f"{self.base_url}/orders/{order_id}/status", json=data, headers=headers)
         if response.status_code != 200:
             raise Exception("Failed to update order status: " + response.json().get("error", "Unknown error"))
         return response.json()
     
 
+    def update_orders_status(self, jwt: str, new_status: str, order_ids=None, filters=None):
+        headers = {"Authorization": f"{jwt}"}
+        data = {"status": new_status}
+        if order_ids is not None:
+            data["ids"] = list(order_ids)
+        if filters is not None:
+            data["filter"] = filters
+        response = self._send("PATCH", f"{self.base_url}/orders/status", json=data, headers=headers)
+        if response.status_code != 200:
+            raise Exception("Failed to update order statuses: " + response.json().get("error", "Unknown error"))
+        return response.json()
+    
+
+    # REPORTS
+    def get_sales_report(self, jwt: str, start=None, end=None, group_by="day", statuses=None, line_type=None, limit=None):
+        headers = {"Authorization": f"{jwt}"}
+        params = {"group_by": group_by}
+        if start is not None:
+            params["start"] = str(start)
+        if end is not None:
+            params["end"] = str(end)
+        if statuses:
+            params["status"] = list(statuses)
+        if line_type is not None:
+            params["type"] = line_type
+        if limit is not None:
+            params["limit"] = limit
+        status_code, data = self._conditional_get(f"{self.base_url}/reports/sales", headers=headers, params=params)
+        if status_code != 200:
+            raise Exception("Failed to fetch sales report: " + data.get("error", "Unknown error"))
+        return data
+
+
     # AUTHORS
     def get_authors(self, jwt: str, include_total=True, page_number=1, page_size=100):
         headers = {"Authorization": f"{jwt}"}
@@ -167,14 +339,21 @@ class ApiClient:
             "page_number": page_number,
             "page_size": page_size
         }
-        response = requests.get(f"{self.base_url}/authors/", headers=headers, params=params)
-        if response.status_code != 200:
-            raise Exception("Failed to fetch authors: " + response.json().get("error", "Unknown error"))
-        return response.json()
+        status_code, data = self._conditional_get(f"{self.base_url}/authors/", headers=headers, params=params)
+        if status_code != 200:
+            raise Exception("Failed to fetch authors: " + data.get("error", "Unknown error"))
+        return data
     
     def get_author_details(self, jwt: str, author_id: int):
         headers = {"Authorization": f"{jwt}"}
-        response = requests.get(f"{self.base_url}/authors/{author_id}", headers=headers)
-        if response.status_code != 200:
-            raise Exception("Failed to fetch author details: " + response.json().get("error", "Unknown error"))
-        return response.json()
\ No newline at end of file
+        status_code, data = self._conditional_get(f"{self.base_url}/authors/{author_id}", headers=headers)
+        if status_code != 200:
+            raise Exception("Failed to fetch author details: " + data.get("error", "Unknown error"))
+        return data
+
+
+def _is_expired(response):
+    try:
+        return response.json().get("message") == "Token has expired!"
+    except ValueError:
+        return False
@@ -109,6 +109,7 @@ def catalog_window(state, api):
         
         if event == "Logout":
             # Clear state on logout
+            api.logout()
             state.jwt = None
             state.user_id = None
             state.role = None
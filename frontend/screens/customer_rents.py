@@ -6,10 +6,8 @@ def customer_rents_window(state, api):
     def fetch_rented_books(state, api):
         try:
             resp = api.get_user_rented_books(state.jwt)
-            rented = resp.get("books", [])
-            for book in rented:
-                resp = api.get_book_details(state.jwt, book['id'])
-            return rented
+            # The list only shows ids and titles, which /books/rented already returns
+            return resp.get("books", [])
         except Exception as e:
             print(f"Error fetching rented books: {e}")
             return []
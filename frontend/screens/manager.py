@@ -20,12 +20,14 @@ def manager_window(state, api):
         event, values = window.read()
         if event == sg.WINDOW_CLOSED:
             # Clear state on logout
+            api.logout()
             state.jwt = None
             state.user_id = None
             state.role = None
             break
         if event == "Logout":
             # Clear state on logout
+            api.logout()
             state.jwt = None
             state.user_id = None
             state.role = None
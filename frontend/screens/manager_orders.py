@@ -9,6 +9,8 @@ PAGE_SIZE = 100
 def manager_orders_window(state, api):
 
     pagination_controls = PaginationControls(current_page=1, total_pages=1, base_key='Page')
+    # Keyset cursor for each page reached so far; pages without one are fetched by page number
+    page_cursors = {1: ""}
 
     def fetch_orders(state, api, status_filter="All", page=1, page_size=PAGE_SIZE):
         try:
@@ -17,9 +19,12 @@ def manager_orders_window(state, api):
             if status == "all":
                 status = None
             
-            resp = api.get_orders(state.jwt, status=status, page_number=page, page_size=page_size)
+            resp = api.get_orders(state.jwt, status=status, page_number=page, page_size=page_size, cursor=page_cursors.get(page))
             orders = resp.get("orders", [])
-            total_pages = resp.get("page", None).get("total_pages", 1)
+            page_info = resp.get("page", {})
+            if page_info.get("next_cursor"):
+                page_cursors[page + 1] = page_info["next_cursor"]
+            total_pages = page_info.get("total_pages", 1)
             pagination_controls.update_total_pages(total_pages)
         except Exception as e:
             print(f"Error fetching orders: {e}")
@@ -54,8 +59,9 @@ def manager_orders_window(state, api):
         [sg.Listbox(values=[], size=(40, 10), key="order_lines_list")],
     ])
     orders_layout = sg.Frame("Orders", [
-        [sg.Listbox(values=[], size=(50, 15), key="orders_list", select_mode=sg.LISTBOX_SELECT_MODE_SINGLE, enable_events=True)],
-        pagination_controls.get_layout()
+        [sg.Listbox(values=[], size=(50, 15), key="orders_list", select_mode=sg.LISTBOX_SELECT_MODE_EXTENDED, enable_events=True)],
+        pagination_controls.get_layout(),
+        [sg.Button("Mark Selected Paid")]
     ])
     layout = [
         [options],
@@ -77,11 +83,13 @@ def manager_orders_window(state, api):
         if current_page is not None:
             run_in_background(window, "-ORDERS_LOADED-", fetch_orders, state, api, status_filter=values["order_status_filter"], page=current_page, page_size=PAGE_SIZE)
 
-        if event == "orders_list":
-            fetch_order_details(state, api, int(values["orders_list"][0].split("|")[0].split(":")[1].strip()), window=window)
+        if event == "orders_list" and values["orders_list"] and values["orders_list"][-1] != 'No orders found.':
+            fetch_order_details(state, api, int(values["orders_list"][-1].split("|")[0].split(":")[1].strip()), window=window)
         
         if event == "Filter":
             current_page = 1
+            page_cursors.clear()
+            page_cursors[1] = ""
             pagination_controls.set_current_page(1)
             run_in_background(window, "-ORDERS_LOADED-", fetch_orders, state, api, status_filter=values["order_status_filter"], page=current_page, page_size=PAGE_SIZE)
             
@@ -101,6 +109,20 @@ def manager_orders_window(state, api):
                 run_in_background(window, "-ORDERS_LOADED-", fetch_orders, state, api, status_filter=values["order_status_filter"])
                 fetch_order_details(state, api, order_id, window=window)
 
+        if event == "Mark Selected Paid":
+            selected = [item for item in values["orders_list"] if item != 'No orders found.']
+            if not selected:
+                sg.popup_error("Please select orders to mark as paid.")
+                continue
+            order_ids = [int(item.split("|")[0].split(":")[1].strip()) for item in selected]
+            try:
+                # Only pending orders are changed; the server reports which ones were
+                resp_json = api.update_orders_status(state.jwt, "completed", order_ids=order_ids, filters={"status": "pending"})
+                sg.popup(f"{len(resp_json.get('updated_ids', []))} of {len(order_ids)} selected orders marked as paid.")
+            except Exception as e:
+                sg.popup_error(f"Error updating order statuses: {e}")
+            run_in_background(window, "-ORDERS_LOADED-", fetch_orders, state, api, status_filter=values["order_status_filter"], page=pagination_controls.current_page, page_size=PAGE_SIZE)
+
         if event == "-ORDERS_LOADED-":
             payload = values[event]
             if payload["ok"]:
@@ -0,0 +1,13 @@
+-- Full-text index for title search. The ngram parser indexes every 2-character
+-- sequence so MATCH ... AGAINST can answer substring searches (title_contains)
+-- without scanning the table like LIKE '%...%' does.
+--
+-- Stopwords must be off when the index is built. With the default InnoDB list the
+-- ngram parser drops every ngram that contains a stopword ("a", "i", "to", ...), so
+-- phrase searches would miss titles that LIKE finds. A later rebuild of the index
+-- (OPTIMIZE TABLE, ALTER TABLE ... FORCE) uses the setting in effect at that time,
+-- so also set innodb_ft_enable_stopword=OFF in the server configuration.
+SET SESSION innodb_ft_enable_stopword = OFF;
+
+ALTER TABLE books
+    ADD FULLTEXT INDEX ft_books_title (title) WITH PARSER ngram;
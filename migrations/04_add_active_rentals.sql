@@ -0,0 +1,25 @@
+-- Ledger of books currently out on rent, one row per rented book. Kept in sync by
+-- create_order and the return endpoint so a user's rentals are an index lookup
+-- instead of a join over their whole order history.
+CREATE TABLE active_rentals (
+    book_id int PRIMARY KEY,
+    user_id int NOT NULL,
+    rented_at timestamp NOT NULL DEFAULT (now()),
+    INDEX idx_active_rentals_user_book (user_id, book_id),
+    FOREIGN KEY (book_id) REFERENCES books (id),
+    FOREIGN KEY (user_id) REFERENCES users (id)
+);
+
+-- Backfill from existing orders: a rented book belongs to the user of its latest rent line
+INSERT INTO active_rentals (book_id, user_id, rented_at)
+SELECT ol.book_id, o.user_id, o.order_date
+FROM (
+    SELECT book_id, MAX(id) AS order_line_id
+    FROM order_lines
+    WHERE type = 'rent'
+    GROUP BY book_id
+) latest
+JOIN order_lines ol ON ol.id = latest.order_line_id
+JOIN orders o ON o.id = ol.order_id
+JOIN books b ON b.id = ol.book_id
+WHERE b.status = 'rented' AND o.user_id IS NOT NULL;
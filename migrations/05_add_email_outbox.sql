@@ -0,0 +1,16 @@
+-- Transactional outbox for order emails. create_order writes a row in the same
+-- transaction as the order, and the email worker (python -m api.services.email_outbox)
+-- sends pending rows, retrying failures with backoff.
+CREATE TABLE email_outbox (
+    id int PRIMARY KEY AUTO_INCREMENT,
+    order_id int,
+    recipient varchar(100) NOT NULL,
+    subject varchar(255) NOT NULL,
+    html_body text NOT NULL,
+    attempts int NOT NULL DEFAULT 0,
+    next_attempt_at datetime NOT NULL,
+    sent_at datetime,
+    created_at timestamp NOT NULL DEFAULT (now()),
+    INDEX idx_email_outbox_pending (sent_at, next_attempt_at),
+    FOREIGN KEY (order_id) REFERENCES orders (id)
+);
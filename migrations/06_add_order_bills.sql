@@ -0,0 +1,9 @@
+-- Bills rendered once at checkout and stored gzip-compressed, served as-is by
+-- GET /api/v1/orders/<id>/bill
+CREATE TABLE order_bills (
+    order_id int PRIMARY KEY,
+    html_gzip blob NOT NULL,
+    etag varchar(64) NOT NULL,
+    created_at timestamp NOT NULL DEFAULT (now()),
+    FOREIGN KEY (order_id) REFERENCES orders (id)
+);
@@ -0,0 +1,7 @@
+-- Composite indexes for newest-first keyset paging of orders on (order_date, id),
+-- with and without a payment_status filter. The status index has the old
+-- single-column payment_status index as its prefix, so that one is dropped.
+ALTER TABLE orders
+    ADD INDEX idx_orders_status_date (payment_status, order_date, id),
+    ADD INDEX idx_orders_date (order_date, id),
+    DROP INDEX idx_orders_payment_status;
@@ -0,0 +1,32 @@
+-- Daily sales rollups by line type and payment status, overall and per author and
+-- keyword. The order endpoints update them incrementally, and GET /api/v1/reports/sales
+-- reads only these tables. Backfill existing orders with:
+--   python -m api.services.sales_rollup rebuild
+CREATE TABLE sales_daily (
+    day date NOT NULL,
+    payment_status enum('pending', 'completed', 'cancelled') NOT NULL,
+    type enum('buy', 'rent') NOT NULL,
+    line_count int NOT NULL DEFAULT 0,
+    revenue decimal(12,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, payment_status, type)
+);
+
+CREATE TABLE sales_daily_authors (
+    day date NOT NULL,
+    author_id int NOT NULL,
+    payment_status enum('pending', 'completed', 'cancelled') NOT NULL,
+    type enum('buy', 'rent') NOT NULL,
+    line_count int NOT NULL DEFAULT 0,
+    revenue decimal(12,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, author_id, payment_status, type)
+);
+
+CREATE TABLE sales_daily_keywords (
+    day date NOT NULL,
+    keyword_id int NOT NULL,
+    payment_status enum('pending', 'completed', 'cancelled') NOT NULL,
+    type enum('buy', 'rent') NOT NULL,
+    line_count int NOT NULL DEFAULT 0,
+    revenue decimal(12,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, keyword_id, payment_status, type)
+);
@@ -0,0 +1,15 @@
+-- Server-tracked refresh tokens for POST /api/v1/users/refresh. Only a SHA-256 hash
+-- of each token is stored. A refresh revokes the presented token and issues the next
+-- one in its family, and presenting a revoked token revokes the whole family.
+CREATE TABLE refresh_tokens (
+    id int PRIMARY KEY AUTO_INCREMENT,
+    user_id int NOT NULL,
+    token_hash char(64) UNIQUE NOT NULL,
+    family_id char(32) NOT NULL,
+    expires_at datetime NOT NULL,
+    revoked_at datetime,
+    created_at timestamp NOT NULL DEFAULT (now()),
+    INDEX idx_refresh_tokens_family (family_id),
+    INDEX idx_refresh_tokens_user_expires (user_id, expires_at),
+    FOREIGN KEY (user_id) REFERENCES users (id)
+);
@@ -0,0 +1,10 @@
+-- Access tokens revoked by logout, by their jti claim. Each API worker keeps a Bloom
+-- filter and an exact set of these, refreshed incrementally by id, so token_required
+-- checks revocation without a query. Rows are deleted once the token has expired.
+CREATE TABLE revoked_tokens (
+    id int PRIMARY KEY AUTO_INCREMENT,
+    jti char(32) UNIQUE NOT NULL,
+    expires_at datetime NOT NULL,
+    created_at timestamp NOT NULL DEFAULT (now()),
+    INDEX idx_revoked_tokens_expires (expires_at)
+);
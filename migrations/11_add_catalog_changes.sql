@@ -0,0 +1,10 @@
+-- Change log for the per-worker catalog index (api/services/catalog_index.py). Every
+-- write to a book's status, author or keywords adds the book id here in the same
+-- transaction. Each API worker replays new rows every few seconds so keyword
+-- filters and facets reflect writes made by other workers. Old rows are purged.
+CREATE TABLE catalog_changes (
+    id int PRIMARY KEY AUTO_INCREMENT,
+    book_id int NOT NULL,
+    changed_at timestamp NOT NULL DEFAULT (now()),
+    INDEX idx_catalog_changes_changed_at (changed_at)
+);
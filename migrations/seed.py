@@ -4,9 +4,11 @@ import random
 from sqlalchemy import func, text, MetaData
 import bcrypt
 from faker import Faker
+from api.services.sales_rollup import rebuild as rebuild_sales_rollups
+from utils.config import Config
 from utils.db import SessionLocal
 from utils.faker_providers import BookTitleProvider, KeywordsProvider
-from utils.models import Author, Book, BookKeyword, Keyword, Order, OrderLine, User
+from utils.models import ActiveRental, Author, Book, BookKeyword, Keyword, Order, OrderLine, User
 
 fake = Faker('en_US')  # For English data
 
@@ -29,7 +31,7 @@ def seed_initial_users(count=10000):
     # Pre-hashed passwords for "pass" for testing purposes
     raw_password = "pass"
     password = raw_password.encode()
-    hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds=12))
+    hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds=Config.BCRYPT_ROUNDS))
     password_hash=hashed.decode()
     
     test_manager = User(
@@ -344,6 +346,8 @@ def seed_initial_orders_with_lines(count=500000):
                             type=ld['type'],
                             price=ld['price']
                         ))
+                        if ld['type'] == 'rent':
+                            order_lines_batch.append(ActiveRental(book_id=ld['book_id'], user_id=ord_obj.user_id, rented_at=ord_obj.order_date))
 
                 session.add_all(order_lines_batch)
                 session.commit()
@@ -365,6 +369,8 @@ def seed_initial_orders_with_lines(count=500000):
                         type=ld['type'],
                         price=ld['price']
                     ))
+                    if ld['type'] == 'rent':
+                        order_lines_batch.append(ActiveRental(book_id=ld['book_id'], user_id=ord_obj.user_id, rented_at=ord_obj.order_date))
             session.add_all(order_lines_batch)
             session.commit()
 
@@ -410,6 +416,7 @@ def seed_all():
     keywords = seed_initial_keywords()
     seed_initial_book_keywords()
     seed_initial_orders_with_lines(count=25000)
+    rebuild_sales_rollups()
 
 if __name__ == "__main__":
     # Get user input to confirm seeding
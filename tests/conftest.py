@@ -0,0 +1,73 @@
+import os
+import tempfile
+import threading
+
+# The API reads its configuration at import, so point it at a SQLite file first
+_db_dir = tempfile.mkdtemp(prefix="bookstore-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_db_dir, 'test.db')}")
+os.environ.setdefault("DB_PASSWORD", "test")
+os.environ.setdefault("JWT_SECRET", "test-secret-key-with-at-least-32-bytes")
+os.environ.setdefault("SMTP_SERVER", "localhost")
+os.environ.setdefault("SMTP_PORT", "2525")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import pytest
+from sqlalchemy import event
+
+from api.app import app as flask_app
+from api.services.tokens import create_access_token
+from utils.db import SessionLocal, engine
+from utils.models import Author, Base, Book, BookKeyword, Keyword, User
+
+BOOK_STATUSES = ("new", "returned", "rented", "sold")
+
+
+@pytest.fixture(scope="session")
+def app():
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    try:
+        session.add_all([
+            User(id=1, email="manager@example.com", username="manager", password_hash="x", role="manager"),
+            User(id=2, email="customer@example.com", username="customer", password_hash="x", role="customer"),
+        ])
+        session.add_all(Author(id=a, name=f"Author {a}", bio="bio") for a in range(1, 11))
+        session.add_all(Keyword(id=k, word=w) for k, w in enumerate(("fantasy", "scifi", "romance"), 1))
+        session.flush()
+        session.add_all(
+            Book(id=b, author_id=b % 10 + 1, title=f"Book {b}", description="description", price_buy=10, price_rent=2, status=BOOK_STATUSES[b % 4])
+            for b in range(1, 301)
+        )
+        session.flush()
+        session.add_all(BookKeyword(book_id=b, keyword_id=b % 3 + 1) for b in range(1, 301))
+        session.commit()
+    finally:
+        session.close()
+    yield flask_app
+    engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def manager_headers():
+    return {"Authorization": create_access_token(1, "manager")}
+
+
+@pytest.fixture
+def count_statements():
+    """Collects the SQL statements the test's own thread runs, ignoring the
+    background refresh threads of the in-memory indexes."""
+    statements = []
+    thread_id = threading.get_ident()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == thread_id:
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(engine, "before_cursor_execute", record)
@@ -0,0 +1,41 @@
+import pytest
+
+from api.services.response_cache import catalog_cache
+
+
+@pytest.fixture(autouse=True)
+def warm_auth(client, manager_headers):
+    # The first authenticated request loads the token revocation list and caches
+    # the user's role; the counts below are for requests after that
+    client.get("/api/v1/books/1", headers=manager_headers)
+    catalog_cache.invalidate("books")
+
+
+@pytest.mark.parametrize("url, expected_books, expected_statements", [
+    # One query for the page or the whole list, authors joined in
+    ("/api/v1/books/?page_size=100", 100, 1),
+    ("/api/v1/books/?status=available&page_size=100", 100, 1),
+    ("/api/v1/books/available", 150, 1),
+    ("/api/v1/books/unavailable", 150, 1),
+    # Cursor mode reads the page's ids first, then the books with their authors
+    ("/api/v1/books/?cursor=&page_size=100", 100, 2),
+])
+def test_book_lists_run_a_fixed_number_of_statements(client, manager_headers, count_statements, url, expected_books, expected_statements):
+    response = client.get(url, headers=manager_headers)
+
+    assert response.status_code == 200
+    books = response.get_json()["books"]
+    assert len(books) == expected_books
+    assert all(book["author"]["name"] for book in books)
+    assert len(count_statements) == expected_statements, count_statements
+
+
+@pytest.mark.parametrize("query", ["", "cursor=&"])
+def test_book_list_statements_do_not_grow_with_page_size(client, manager_headers, count_statements, query):
+    client.get(f"/api/v1/books/?{query}page_size=10", headers=manager_headers)
+    small_page = len(count_statements)
+    count_statements.clear()
+
+    client.get(f"/api/v1/books/?{query}page_size=200", headers=manager_headers)
+
+    assert len(count_statements) == small_page
@@ -12,11 +12,27 @@ class Config:
     DB_PASSWORD = os.getenv('DB_PASSWORD')
     DB_PASSWORD_SAFE = quote_plus(DB_PASSWORD)
     JWT_SECRET_KEY = os.getenv('JWT_SECRET')
-    SQLALCHEMY_DATABASE_URI = f"mysql+mysqlconnector://{DB_USER}:{DB_PASSWORD_SAFE}@{DB_HOST}/{DB_NAME}"
+    # DATABASE_URL overrides the MySQL settings, e.g. with a SQLite file for the tests
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL') or f"mysql+mysqlconnector://{DB_USER}:{DB_PASSWORD_SAFE}@{DB_HOST}/{DB_NAME}"
     SMTP_SERVER = os.getenv('SMTP_SERVER')
     SMTP_PORT = int(os.getenv('SMTP_PORT'))
     SMTP_USERNAME = os.getenv('SMTP_USERNAME')
     SMTP_PASSWORD = os.getenv('SMTP_PASSWORD')
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+    # Per-module overrides, e.g. "api.auth=WARNING,api.routes.books=DEBUG"
+    LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+    # Fraction of requests whose info/debug records are logged; warnings and errors always are
+    LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '1.0'))
+    # Lifetime of a refresh token; each refresh replaces it with a new one
+    REFRESH_TOKEN_DAYS = int(os.getenv('REFRESH_TOKEN_DAYS', '14'))
+    # bcrypt cost for new hashes; stored hashes with another cost are rehashed on login
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+    BCRYPT_POOL_SIZE = int(os.getenv('BCRYPT_POOL_SIZE', str(min(4, os.cpu_count() or 1))))
+    # Hashes allowed to wait behind the running ones before requests get a 429; keep
+    # BCRYPT_POOL_SIZE + BCRYPT_MAX_QUEUE well below the number of web worker threads
+    BCRYPT_MAX_QUEUE = int(os.getenv('BCRYPT_MAX_QUEUE', str(BCRYPT_POOL_SIZE)))
+    # Seconds a queued hash may wait for a thread before the request gets a 503
+    BCRYPT_QUEUE_TIMEOUT = float(os.getenv('BCRYPT_QUEUE_TIMEOUT', '2'))
 
 def decode_token(token):
     return jwt.decode(token, Config.JWT_SECRET_KEY, algorithms=["HS256"])
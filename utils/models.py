@@ -67,7 +67,8 @@ class Book(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     author_id = Column(Integer, ForeignKey('authors.id'), nullable=False)
     title = Column(String(255), nullable=False)
-    description = Column(Text)
+    # Large column, only loaded when accessed or explicitly requested
+    description = sqlalchemy.orm.deferred(Column(Text))
     price_buy = Column(sqlalchemy.DECIMAL(7, 2), nullable=False)
     price_rent = Column(sqlalchemy.DECIMAL(7, 2), nullable=False)
     status = Column(sqlalchemy.Enum('new', 'rented', 'sold', 'returned', name='book_status'), nullable=False, server_default='new')
@@ -77,11 +78,12 @@ class Book(Base):
     keywords = sqlalchemy.orm.relationship("BookKeyword", back_populates="book")
     order_lines = sqlalchemy.orm.relationship("OrderLine", back_populates="book")
 
-    # indexing on title and status and author_id
+    # indexing on title and status and author_id, plus a full-text index on title
     __table_args__ = (
         sqlalchemy.Index('idx_books_title', 'title'),
         sqlalchemy.Index('idx_books_status', 'status'),
         sqlalchemy.Index('idx_books_author_id', 'author_id'),
+        sqlalchemy.Index('ft_books_title', 'title', mysql_prefix='FULLTEXT', mysql_with_parser='ngram'),
     )
 
 # CREATE TABLE keywords (
@@ -118,6 +120,26 @@ class BookKeyword(Base):
     keyword = sqlalchemy.orm.relationship("Keyword", back_populates="books")
 
 
+# Ids of books whose status, author or keywords changed, written in the same transaction
+# as the change. Each API worker replays new rows into its in-memory catalog index.
+# CREATE TABLE catalog_changes (
+#     id int PRIMARY KEY AUTO_INCREMENT,
+#     book_id int NOT NULL,
+#     changed_at timestamp NOT NULL DEFAULT (now())
+# );
+class CatalogChange(Base):
+    __tablename__ = 'catalog_changes'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    book_id = Column(Integer, nullable=False)
+    changed_at = Column(sqlalchemy.TIMESTAMP, nullable=False, server_default=sqlalchemy.func.now())
+
+    # indexing on the time for the purge of old rows
+    __table_args__ = (
+        sqlalchemy.Index('idx_catalog_changes_changed_at', 'changed_at'),
+    )
+
+
 # CREATE TABLE orders (
 #     id int PRIMARY KEY AUTO_INCREMENT,
 #     user_id int,
@@ -140,9 +162,11 @@ class Order(Base):
     user = sqlalchemy.orm.relationship("User", back_populates="orders")
     order_lines = sqlalchemy.orm.relationship("OrderLine", back_populates="order")
 
-    # indexing on payment_status and user_id
+    # indexing on user_id, plus (order_date, id) with and without payment_status for
+    # newest-first keyset paging
     __table_args__ = (
-        sqlalchemy.Index('idx_orders_payment_status', 'payment_status'),
+        sqlalchemy.Index('idx_orders_status_date', 'payment_status', 'order_date', 'id'),
+        sqlalchemy.Index('idx_orders_date', 'order_date', 'id'),
         sqlalchemy.Index('idx_orders_user_id', 'user_id'),
     )
 
@@ -167,4 +191,182 @@ class OrderLine(Base):
 
     order = sqlalchemy.orm.relationship("Order", back_populates="order_lines")
     book = sqlalchemy.orm.relationship("Book", back_populates="order_lines")
-    
\ No newline at end of file
+    
+
+# CREATE TABLE active_rentals (
+#     book_id int PRIMARY KEY,
+#     user_id int NOT NULL,
+#     rented_at timestamp NOT NULL DEFAULT (now())
+# );
+# ALTER TABLE active_rentals ADD FOREIGN KEY (book_id) REFERENCES books (id);
+# ALTER TABLE active_rentals ADD FOREIGN KEY (user_id) REFERENCES users (id);
+class ActiveRental(Base):
+    __tablename__ = 'active_rentals'
+
+    # A book is rented by at most one user at a time
+    book_id = Column(Integer, ForeignKey('books.id'), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    rented_at = Column(sqlalchemy.TIMESTAMP, nullable=False, server_default=sqlalchemy.func.now())
+
+    # indexing on user_id, covering the book ids of a user's rentals
+    __table_args__ = (
+        sqlalchemy.Index('idx_active_rentals_user_book', 'user_id', 'book_id'),
+    )
+
+
+# CREATE TABLE email_outbox (
+#     id int PRIMARY KEY AUTO_INCREMENT,
+#     order_id int,
+#     recipient varchar(100) NOT NULL,
+#     subject varchar(255) NOT NULL,
+#     html_body text NOT NULL,
+#     attempts int NOT NULL DEFAULT 0,
+#     next_attempt_at datetime NOT NULL,
+#     sent_at datetime,
+#     created_at timestamp NOT NULL DEFAULT (now())
+# );
+# ALTER TABLE email_outbox ADD FOREIGN KEY (order_id) REFERENCES orders (id);
+class EmailOutbox(Base):
+    __tablename__ = 'email_outbox'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    order_id = Column(Integer, ForeignKey('orders.id'))
+    recipient = Column(String(100), nullable=False)
+    subject = Column(String(255), nullable=False)
+    html_body = Column(Text, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(sqlalchemy.DateTime, nullable=False)
+    sent_at = Column(sqlalchemy.DateTime)
+    created_at = Column(sqlalchemy.TIMESTAMP, nullable=False, server_default=sqlalchemy.func.now())
+
+    # indexing on the columns the worker polls by
+    __table_args__ = (
+        sqlalchemy.Index('idx_email_outbox_pending', 'sent_at', 'next_attempt_at'),
+    )
+
+
+# CREATE TABLE order_bills (
+#     order_id int PRIMARY KEY,
+#     html_gzip blob NOT NULL,
+#     etag varchar(64) NOT NULL,
+#     created_at timestamp NOT NULL DEFAULT (now())
+# );
+# ALTER TABLE order_bills ADD FOREIGN KEY (order_id) REFERENCES orders (id);
+class OrderBill(Base):
+    __tablename__ = 'order_bills'
+
+    order_id = Column(Integer, ForeignKey('orders.id'), primary_key=True)
+    # Rendered bill HTML, gzip-compressed once and served as stored
+    html_gzip = Column(sqlalchemy.LargeBinary, nullable=False)
+    etag = Column(String(64), nullable=False)
+    created_at = Column(sqlalchemy.TIMESTAMP, nullable=False, server_default=sqlalchemy.func.now())
+
+
+# Refresh tokens are stored only as a SHA-256 hash. Each login starts a family; every
+# refresh revokes the presented token and issues the next one in the same family.
+# CREATE TABLE refresh_tokens (
+#     id int PRIMARY KEY AUTO_INCREMENT,
+#     user_id int NOT NULL,
+#     token_hash char(64) UNIQUE NOT NULL,
+#     family_id char(32) NOT NULL,
+#     expires_at datetime NOT NULL,
+#     revoked_at datetime,
+#     created_at timestamp NOT NULL DEFAULT (now())
+# );
+# ALTER TABLE refresh_tokens ADD FOREIGN KEY (user_id) REFERENCES users (id);
+class RefreshToken(Base):
+    __tablename__ = 'refresh_tokens'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    token_hash = Column(String(64), unique=True, nullable=False)
+    family_id = Column(String(32), nullable=False)
+    expires_at = Column(sqlalchemy.DateTime, nullable=False)
+    revoked_at = Column(sqlalchemy.DateTime)
+    created_at = Column(sqlalchemy.TIMESTAMP, nullable=False, server_default=sqlalchemy.func.now())
+
+    # indexing on the family (revoked together on reuse) and on the user's expiry purge
+    __table_args__ = (
+        sqlalchemy.Index('idx_refresh_tokens_family', 'family_id'),
+        sqlalchemy.Index('idx_refresh_tokens_user_expires', 'user_id', 'expires_at'),
+    )
+
+
+# Access tokens revoked by logout, by their jti claim, kept until the token expires
+# CREATE TABLE revoked_tokens (
+#     id int PRIMARY KEY AUTO_INCREMENT,
+#     jti char(32) UNIQUE NOT NULL,
+#     expires_at datetime NOT NULL,
+#     created_at timestamp NOT NULL DEFAULT (now())
+# );
+class RevokedToken(Base):
+    __tablename__ = 'revoked_tokens'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    jti = Column(String(32), unique=True, nullable=False)
+    expires_at = Column(sqlalchemy.DateTime, nullable=False)
+    created_at = Column(sqlalchemy.TIMESTAMP, nullable=False, server_default=sqlalchemy.func.now())
+
+    # indexing on expiry for the purge of expired rows
+    __table_args__ = (
+        sqlalchemy.Index('idx_revoked_tokens_expires', 'expires_at'),
+    )
+
+
+# Daily sales rollups, kept current by the order endpoints (see api/services/sales_rollup.py)
+# CREATE TABLE sales_daily (
+#     day date NOT NULL,
+#     payment_status enum('pending', 'completed', 'cancelled') NOT NULL,
+#     type enum('buy', 'rent') NOT NULL,
+#     line_count int NOT NULL DEFAULT 0,
+#     revenue decimal(12,2) NOT NULL DEFAULT 0,
+#     PRIMARY KEY (day, payment_status, type)
+# );
+class SalesDaily(Base):
+    __tablename__ = 'sales_daily'
+
+    day = Column(sqlalchemy.Date, primary_key=True)
+    payment_status = Column(sqlalchemy.Enum('pending', 'completed', 'cancelled', name='payment_status'), primary_key=True)
+    type = Column(sqlalchemy.Enum('buy', 'rent', name='order_line_type'), primary_key=True)
+    line_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(sqlalchemy.DECIMAL(12, 2), nullable=False, default=0)
+
+
+# CREATE TABLE sales_daily_authors (
+#     day date NOT NULL,
+#     author_id int NOT NULL,
+#     payment_status enum('pending', 'completed', 'cancelled') NOT NULL,
+#     type enum('buy', 'rent') NOT NULL,
+#     line_count int NOT NULL DEFAULT 0,
+#     revenue decimal(12,2) NOT NULL DEFAULT 0,
+#     PRIMARY KEY (day, author_id, payment_status, type)
+# );
+class SalesDailyAuthor(Base):
+    __tablename__ = 'sales_daily_authors'
+
+    day = Column(sqlalchemy.Date, primary_key=True)
+    author_id = Column(Integer, primary_key=True)
+    payment_status = Column(sqlalchemy.Enum('pending', 'completed', 'cancelled', name='payment_status'), primary_key=True)
+    type = Column(sqlalchemy.Enum('buy', 'rent', name='order_line_type'), primary_key=True)
+    line_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(sqlalchemy.DECIMAL(12, 2), nullable=False, default=0)
+
+
+# CREATE TABLE sales_daily_keywords (
+#     day date NOT NULL,
+#     keyword_id int NOT NULL,
+#     payment_status enum('pending', 'completed', 'cancelled') NOT NULL,
+#     type enum('buy', 'rent') NOT NULL,
+#     line_count int NOT NULL DEFAULT 0,
+#     revenue decimal(12,2) NOT NULL DEFAULT 0,
+#     PRIMARY KEY (day, keyword_id, payment_status, type)
+# );
+class SalesDailyKeyword(Base):
+    __tablename__ = 'sales_daily_keywords'
+
+    day = Column(sqlalchemy.Date, primary_key=True)
+    keyword_id = Column(Integer, primary_key=True)
+    payment_status = Column(sqlalchemy.Enum('pending', 'completed', 'cancelled', name='payment_status'), primary_key=True)
+    type = Column(sqlalchemy.Enum('buy', 'rent', name='order_line_type'), primary_key=True)
+    line_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(sqlalchemy.DECIMAL(12, 2), nullable=False, default=0)